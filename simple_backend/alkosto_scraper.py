@@ -1,107 +1,117 @@
+import re
 import time
-from decimal import Decimal
 from typing import List, Optional
 
 from urllib.parse import urljoin
 
 import requests
-from bs4 import BeautifulSoup
+from selectolax.lexbor import LexborHTMLParser
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from sqlalchemy.orm import Session
 
 from db import SessionLocal
-from main import normalize_text, haversine_km, Location, ProductResult, SearchFilters
+from main import normalize_text, tokenize_query, Location, ProductResult, SearchFilters, cached_scrape
 
 # Endpoint de búsqueda de Alkosto
 BASE_SEARCH_URL = "https://www.alkosto.com/search"
 BASE_ORIGIN = "https://www.alkosto.com"
 
+# Limpieza de precios: deja solo dígitos y punto decimal ("S/ 1,299.00" -> "1299.00")
+PRICE_CLEAN_RE = re.compile(r"[^\d.]")
+
 ALKOSTO_LAT = -12.06
 ALKOSTO_LON = -77.04
 
+# Invariantes de cada resultado: se crean una vez al importar el módulo
+ALKOSTO_LOCATION = Location(lat=ALKOSTO_LAT, lon=ALKOSTO_LON)
+ALKOSTO_PAYMENT_METHODS = ("tarjeta", "efectivo")
+
+# Sesión compartida: reutiliza conexiones TCP/TLS entre búsquedas
+SESSION = requests.Session()
+SESSION.headers.update({
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/120.0 Safari/537.36"
+    )
+})
+SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=10,
+        pool_maxsize=20,
+        max_retries=Retry(total=2, backoff_factor=0.3),
+    ),
+)
+
+@cached_scrape
 def scrape_alkosto_live(
     query: str,
-    user_location: Optional[Location] = None,
     filters: Optional[SearchFilters] = None,
+    query_tokens: Optional[frozenset] = None,
 ) -> List[ProductResult]:
     """
     Scraper en vivo para Alkosto (Perú).
     Alkosto usa estructura con contenedores de producto.
     """
-    headers = {
-        "User-Agent": (
-            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-            "AppleWebKit/537.36 (KHTML, like Gecko) "
-            "Chrome/120.0 Safari/537.36"
-        )
-    }
-
     params = {"query": query}
 
     try:
-        resp = requests.get(BASE_SEARCH_URL, params=params, headers=headers, timeout=20)
+        resp = SESSION.get(BASE_SEARCH_URL, params=params, timeout=20)
         resp.raise_for_status()
     except Exception as e:
         print(f"Error al conectar con Alkosto: {e}")
         return []
 
-    soup = BeautifulSoup(resp.text, "html.parser")
+    # Bytes crudos: el parser detecta la codificación y evitamos que requests
+    # la adivine con charset-normalizer al construir resp.text
+    tree = LexborHTMLParser(resp.content)
 
     # Alkosto usa estructura: div con clase "producto"
-    product_cards = soup.select("div[class*='producto'], article[class*='producto']")
+    product_cards = tree.css("div[class*='producto'], article[class*='producto']")
 
     results: List[ProductResult] = []
 
+    # Palabras de la query: se calculan una sola vez para todas las tarjetas
+    # (o vienen ya calculadas desde la búsqueda combinada)
+    if query_tokens is None:
+        query_tokens = tokenize_query(query)
+
     for idx, card in enumerate(product_cards, start=1):
         try:
-            # ========= MARCA =========
-            brand_el = card.select_one("[class*='brand'], [class*='marca'], .brand")
-            brand = brand_el.get_text(strip=True) if brand_el else None
-
             # ========= NOMBRE =========
-            name_el = card.select_one("[class*='product-name'], [class*='titulo'], .product-name, h2, h3")
+            name_el = card.css_first("[class*='product-name'], [class*='titulo'], .product-name, h2, h3")
             if not name_el:
                 continue
-            name = name_el.get_text(strip=True)
+            name = name_el.text(strip=True)
+
+            # ========= MARCA =========
+            brand_el = card.css_first("[class*='brand'], [class*='marca'], .brand")
+            brand = brand_el.text(strip=True) if brand_el else None
 
             # ========= FILTRO ESTRICTO POR PALABRAS =====
-            full_name = f"{name} {brand or ''}"
+            full_name = f"{name} {brand}" if brand else name
             norm_full_name = normalize_text(full_name)
 
-            query_tokens = [t for t in normalize_text(query).split()]
-            full_name_words = norm_full_name.split()
-            
-            if query_tokens and not all(tok in full_name_words for tok in query_tokens):
+            full_name_words = frozenset(norm_full_name.split())
+
+            if query_tokens and not query_tokens.issubset(full_name_words):
                 continue
 
             # ========= PRECIO =========
-            price_el = card.select_one("[class*='price'], [class*='precio'], .price, .precio")
+            price_el = card.css_first("[class*='price'], [class*='precio'], .price, .precio")
             if not price_el:
                 continue
 
-            price_text = price_el.get_text(strip=True)
-            digits = (
-                price_text.replace("S/", "")
-                .replace("S/.", "")
-                .replace("s/", "")
-                .replace("\xa0", " ")
-                .replace(" ", "")
-                .replace(",", "")
-            )
+            price_text = price_el.text(strip=True)
+            digits = PRICE_CLEAN_RE.sub("", price_text)
 
             try:
-                price = float(Decimal(digits))
-            except Exception:
+                price = float(digits)
+            except ValueError:
                 continue
 
-            # ========= IMAGEN =========
-            img_el = card.select_one("img")
-            image_url = img_el["src"] if img_el and img_el.get("src") else None
-
-            # ========= URL DEL PRODUCTO =========
-            link_el = card.select_one("a[href]")
-            href = link_el.get("href") if link_el else None
-            product_url = urljoin(BASE_ORIGIN, href) if href else None
-
             # ========= FILTROS SIMPLES =========
             if filters:
                 if filters.max_price is not None and price > filters.max_price:
@@ -110,22 +120,26 @@ def scrape_alkosto_live(
                     if not brand or filters.brand.lower() not in brand.lower():
                         continue
 
-            # ========= DISTANCIA =========
-            if user_location:
-                distance = haversine_km(
-                    user_location.lat,
-                    user_location.lon,
-                    ALKOSTO_LAT,
-                    ALKOSTO_LON,
-                )
-                distance_km = round(distance, 3)
-            else:
-                distance_km = None
+            # ========= IMAGEN =========
+            img_el = card.css_first("img")
+            image_url = img_el.attributes.get("src") if img_el else None
 
-            payment_methods = ["tarjeta", "efectivo"]
+            # ========= URL DEL PRODUCTO =========
+            link_el = card.css_first("a[href]")
+            href = link_el.attributes.get("href") if link_el else None
+            if not href:
+                product_url = None
+            elif href.startswith(("https://", "http://")):
+                product_url = href
+            elif href.startswith("/") and not href.startswith("//"):
+                product_url = BASE_ORIGIN + href
+            else:
+                # Casos raros (relativas sin "/", "//cdn..."): urljoin completo
+                product_url = urljoin(BASE_ORIGIN, href)
 
+            # Datos ya tipados por el scraper: model_construct evita revalidarlos
             results.append(
-                ProductResult(
+                ProductResult.model_construct(
                     product_id=idx,
                     name=name,
                     brand=brand,
@@ -136,9 +150,9 @@ def scrape_alkosto_live(
                     currency="PEN",
                     store_id=4,
                     store_name="Alkosto Online",
-                    store_location=Location(lat=ALKOSTO_LAT, lon=ALKOSTO_LON),
-                    distance_km=distance_km,
-                    payment_methods=payment_methods,
+                    store_location=ALKOSTO_LOCATION,
+                    distance_km=None,
+                    payment_methods=list(ALKOSTO_PAYMENT_METHODS),
                 )
             )
 
@@ -146,15 +160,4 @@ def scrape_alkosto_live(
             print(f"Error procesando producto de Alkosto: {e}")
             continue
 
-    # Ordenar resultados
-    if user_location:
-        results.sort(
-            key=lambda r: (
-                r.distance_km if r.distance_km is not None else 999999,
-                r.price,
-            )
-        )
-    else:
-        results.sort(key=lambda r: r.price)
-
     return results
@@ -1,17 +1,92 @@
+import logging
+import re
 import time
+from datetime import datetime
 from decimal import Decimal
 
 import requests
-from bs4 import BeautifulSoup
+from selectolax.lexbor import LexborHTMLParser
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy import inspect
 from sqlalchemy.orm import Session
 
 from db import SessionLocal
 from main import normalize_text
 from models import Store, Product, InventoryItem
 
+logger = logging.getLogger("simple_backend.hiraoka")
+
 # Endpoint de búsqueda de Hiraoka
 BASE_SEARCH_URL = "https://hiraoka.com.pe/gpsearch/"
 
+# Limpieza de precios: deja solo dígitos y punto decimal ("S/ 1,299.00" -> "1299.00")
+PRICE_CLEAN_RE = re.compile(r"[^\d.]")
+
+# Sesión compartida: reutiliza conexiones TCP/TLS entre búsquedas
+SESSION = requests.Session()
+SESSION.headers.update({
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/120.0 Safari/537.36"
+    )
+})
+SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=10,
+        pool_maxsize=20,
+        max_retries=Retry(total=2, backoff_factor=0.3),
+    ),
+)
+
+# Para no abusar del sitio: espaciado mínimo entre requests a Hiraoka
+MIN_REQUEST_INTERVAL = 1.0
+_last_request_at = 0.0
+
+
+def _throttle() -> None:
+    global _last_request_at
+    wait = MIN_REQUEST_INTERVAL - (time.monotonic() - _last_request_at)
+    if wait > 0:
+        time.sleep(wait)
+    _last_request_at = time.monotonic()
+
+
+# INSERT ... ON CONFLICT por dialecto (Postgres en producción, SQLite en local)
+_UPSERT_INSERTS = {"postgresql": pg_insert, "sqlite": sqlite_insert}
+
+# Motores (por URL) donde ya se comprobó el índice único de inventario
+_UPSERT_READY: set[str] = set()
+
+
+def _has_inventory_unique_index(db: Session) -> bool:
+    """
+    ON CONFLICT (store_id, product_id) exige un índice único sobre esas columnas.
+    Una BD creada antes de ix_inv_store_product (y sin migrar) no lo tiene.
+    """
+    bind = db.get_bind()
+    url = str(bind.url)
+    if url in _UPSERT_READY:
+        return True
+    columns = ["store_id", "product_id"]
+    inspector = inspect(db.connection())
+    has_index = any(
+        ix["unique"] and ix["column_names"] == columns
+        for ix in inspector.get_indexes(InventoryItem.__tablename__)
+    ) or any(
+        uc["column_names"] == columns
+        for uc in inspector.get_unique_constraints(InventoryItem.__tablename__)
+    )
+    # Solo se recuerda el caso positivo: una migración posterior lo habilita
+    if has_index:
+        _UPSERT_READY.add(url)
+    return has_index
+
+
 def get_session() -> Session:
     return SessionLocal()
 
@@ -34,167 +109,192 @@ def get_or_create_hiraoka_store(db: Session) -> Store:
     db.refresh(store)
     return store
 
-def upsert_product_and_inventory(
-    db: Session,
-    store: Store,
-    name: str,
-    brand: str | None,
-    category: str | None,
-    price: Decimal,
-    image_url: str | None,
-):
-    # 1. Buscar si ya existe el producto (nombre + marca)
-    q = db.query(Product).filter(Product.name == name)
-    if brand:
-        q = q.filter(Product.brand == brand)
-    product = q.first()
-
-    if not product:
-        product = Product(
-            name=name,
-            brand=brand,
-            category=category,
-            description=None,
-            image_url=image_url,
-        )
-        db.add(product)
-        db.commit()
-        db.refresh(product)
-
-    # 2. Buscar/crear inventario para esa tienda + producto
-    inv = (
-        db.query(InventoryItem)
-        .filter(
-            InventoryItem.store_id == store.id,
-            InventoryItem.product_id == product.id,
-        )
-        .first()
-    )
+def upsert_products_and_inventory(db: Session, store: Store, items: list[dict]):
+    """
+    Inserta/actualiza en lote los productos scrapeados y su inventario.
+    `items` es una lista de dicts con name, brand, category, price, image_url.
+    Hace 1 SELECT de productos, 1 upsert de inventario y un único commit.
+    """
+    if not items:
+        return
+
+    # 1. Traer de una vez los productos existentes con esos nombres
+    names = {item["name"] for item in items}
+    by_name_brand: dict[tuple[str, str | None], Product] = {}
+    by_name: dict[str, Product] = {}
+    for product in db.query(Product).filter(Product.name.in_(names)):
+        by_name_brand.setdefault((product.name, product.brand), product)
+        by_name.setdefault(product.name, product)
+
+    # 2. Crear los que faltan (nombre + marca; sin marca basta el nombre)
+    resolved: list[tuple[dict, Product]] = []
+    new_products: list[Product] = []
+    for item in items:
+        name, brand = item["name"], item["brand"]
+        product = by_name_brand.get((name, brand)) if brand else by_name.get(name)
+        if not product:
+            product = Product(
+                name=name,
+                brand=brand,
+                category=item["category"],
+                description=None,
+                image_url=item["image_url"],
+            )
+            new_products.append(product)
+            by_name_brand.setdefault((name, brand), product)
+            by_name.setdefault(name, product)
+        resolved.append((item, product))
 
-    if not inv:
-        inv = InventoryItem(
-            store_id=store.id,
-            product_id=product.id,
-            price=price,
-            currency="PEN",
-            stock=None,
+    if new_products:
+        db.add_all(new_products)
+        db.flush()  # asigna los ids sin hacer commit
+
+    # 3. Inventario: un solo INSERT ... ON CONFLICT (store_id, product_id)
+    # DO UPDATE para todas las filas. La columna es Numeric: convertimos el
+    # precio vía str para no arrastrar el error binario del float
+    # (p. ej. 1299.9 -> Decimal("1299.9")). Si un producto se repite, gana el último.
+    now = datetime.utcnow()
+    rows = {
+        product.id: {
+            "store_id": store.id,
+            "product_id": product.id,
+            "price": Decimal(str(item["price"])),
+            "currency": "PEN",
+            "stock": None,
+            "last_updated": now,
+        }
+        for item, product in resolved
+    }
+
+    dialect_insert = _UPSERT_INSERTS.get(db.get_bind().dialect.name)
+    if dialect_insert is not None and _has_inventory_unique_index(db):
+        stmt = dialect_insert(InventoryItem.__table__).values(list(rows.values()))
+        db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["store_id", "product_id"],
+                set_={
+                    "price": stmt.excluded.price,
+                    "last_updated": stmt.excluded.last_updated,
+                },
+            )
         )
-        db.add(inv)
     else:
-        # Actualizar precio si ya existe
-        inv.price = price
+        # Otros motores, o BD sin el índice único: actualizar con el ORM los
+        # existentes e insertar el resto
+        inventory = {
+            inv.product_id: inv
+            for inv in db.query(InventoryItem).filter(
+                InventoryItem.store_id == store.id,
+                InventoryItem.product_id.in_(rows),
+            )
+        }
+        for product_id, row in rows.items():
+            inv = inventory.get(product_id)
+            if inv:
+                inv.price = row["price"]
+                inv.last_updated = now
+            else:
+                db.add(InventoryItem(**row))
 
     db.commit()
 
 def scrape_hiraoka_search(db: Session, query: str, category: str | None = None):
     store = get_or_create_hiraoka_store(db)
 
-    headers = {
-        "User-Agent": (
-            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-            "AppleWebKit/537.36 (KHTML, like Gecko) "
-            "Chrome/120.0 Safari/537.36"
-        )
-    }
-
     params = {"q": query}
     print(f"Buscando en Hiraoka: {BASE_SEARCH_URL} con q={query}")
-    resp = requests.get(BASE_SEARCH_URL, params=params, headers=headers, timeout=20)
+    _throttle()
+    resp = SESSION.get(BASE_SEARCH_URL, params=params, timeout=20)
     resp.raise_for_status()
 
-    soup = BeautifulSoup(resp.text, "html.parser")
+    # Bytes crudos: el parser detecta la codificación y evitamos que requests
+    # la adivine con charset-normalizer al construir resp.text
+    tree = LexborHTMLParser(resp.content)
 
     # Cada producto está en un <div class="product-item-info" data-container="product-grid">
-    product_cards = soup.select("div.product-item-info[data-container='product-grid']")
+    product_cards = tree.css("div.product-item-info[data-container='product-grid']")
     print(f"Productos encontrados en HTML: {len(product_cards)}")
 
+    # Partimos la query en palabras (una sola vez para todas las tarjetas)
+    query_tokens = frozenset(normalize_text(query).split())
+
+    items: list[dict] = []
+
     for card in product_cards:
         # ===== NOMBRE =====
         # <strong class="product name product-item-name"> <a class="product-item-link">Nombre</a> ...
-        name_el = card.select_one("strong.product.name.product-item-name a.product-item-link")
+        name_el = card.css_first("strong.product.name.product-item-name a.product-item-link")
         if not name_el:
             continue
-        name = name_el.get_text(strip=True)
+        name = name_el.text(strip=True)
 
         # ===== MARCA =====
         # <strong class="product brand product-item-brand"> <a class="product-item-link">HUAWEI</a> ...
-        brand_el = card.select_one("strong.product.brand.product-item-brand a.product-item-link")
-        brand = brand_el.get_text(strip=True) if brand_el else None
+        brand_el = card.css_first("strong.product.brand.product-item-brand a.product-item-link")
+        brand = brand_el.text(strip=True) if brand_el else None
 
                 # ===== FILTRO ESTRICTO POR PALABRAS DE LA QUERY =====
         # Unimos nombre + marca y normalizamos (minúsculas, sin tildes)
-        full_name = f"{name} {brand or ''}"
+        full_name = f"{name} {brand}" if brand else name
         norm_full_name = normalize_text(full_name)
 
-        # Partimos la query en palabras
-        query_tokens = [
-            t for t in normalize_text(query).split()
-        ]
-
         # Si quieres que TODAS las palabras de la query aparezcan como palabras EXACTAS en el nombre+marca:
-        full_name_words = norm_full_name.split()
-        print(f"DEBUG: query_tokens={query_tokens}, full_name_words={full_name_words}")
-        if query_tokens and not all(tok in full_name_words for tok in query_tokens):
+        full_name_words = frozenset(norm_full_name.split())
+        logger.debug("query_tokens=%s full_name_words=%s", query_tokens, full_name_words)
+        if query_tokens and not query_tokens.issubset(full_name_words):
             # Este producto no cumple con la búsqueda estricta, lo saltamos
-            print(f"FILTRADO: {name} {brand} - no contiene todas las palabras")
+            logger.debug("FILTRADO: %s %s - no contiene todas las palabras", name, brand)
             continue
 
 
         # ===== PRECIO =====
         # Dentro de <div class="price-box ...">
         # Hay un <span id="product-price-85072" data-price-amount="3699" data-price-type="finalPrice" ...>
-        price_wrapper = card.select_one("div.price-box [data-price-type='finalPrice']")
+        price_wrapper = card.css_first("div.price-box [data-price-type='finalPrice']")
         if not price_wrapper:
             # fallback: buscar el texto de la clase .price
-            price_text_el = card.select_one("div.price-box span.price")
+            price_text_el = card.css_first("div.price-box span.price")
             if not price_text_el:
                 print(f"Sin precio para producto: {name}")
                 continue
-            price_text = price_text_el.get_text(strip=True)
-            digits = (
-                price_text.replace("S/", "")
-                .replace("S/.", "")
-                .replace("s/", "")
-                .replace(" ", "")
-                .replace(",", "")
-            )
+            price_text = price_text_el.text(strip=True)
+            digits = PRICE_CLEAN_RE.sub("", price_text)
             try:
-                price = Decimal(digits)
-            except Exception:
+                price = float(digits)
+            except ValueError:
                 print(f"No pude convertir el precio (texto): {price_text}")
                 continue
         else:
             # Mejor: usar el atributo data-price-amount="3699"
-            price_amount = price_wrapper.get("data-price-amount")
+            price_amount = price_wrapper.attributes.get("data-price-amount")
             try:
-                price = Decimal(price_amount)
-            except Exception:
+                price = float(price_amount)
+            except (TypeError, ValueError):
                 print(f"No pude convertir el precio (data-price-amount): {price_amount}")
                 continue
 
         # ===== IMAGEN =====
         # <img class="product-image-photo" src="...">
-        img_el = card.select_one("img.product-image-photo")
-        image_url = img_el["src"] if img_el and img_el.has_attr("src") else None
+        img_el = card.css_first("img.product-image-photo")
+        image_url = img_el.attributes.get("src") if img_el else None
 
         # ===== CATEGORÍA =====
         # Por ahora puedes pasarla como parámetro según lo que estás buscando
         cat_value = category
 
-        print(f"- {name} | {brand} | {price} | {image_url}")
+        logger.debug("- %s | %s | %s | %s", name, brand, price, image_url)
 
-        upsert_product_and_inventory(
-            db=db,
-            store=store,
-            name=name,
-            brand=brand,
-            category=cat_value,
-            price=price,
-            image_url=image_url,
+        items.append(
+            {
+                "name": name,
+                "brand": brand,
+                "category": cat_value,
+                "price": price,
+                "image_url": image_url,
+            }
         )
 
-        # Para no abusar del sitio
-        time.sleep(0.2)
+    upsert_products_and_inventory(db, store, items)
 
 def main():
     db = get_session()
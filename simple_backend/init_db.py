@@ -104,11 +104,12 @@ stores = [
     ),
 ]
 
+db.add_all(stores)
+db.commit()
+
 for store in stores:
-    db.add(store)
     print(f"✓ Tienda creada: {store.name} ({store.code})")
 
-db.commit()
 db.close()
 
 print(f"\n✓ Total tiendas insertadas: {len(stores)}")
@@ -1,10 +1,9 @@
-import json
-from decimal import Decimal
 from typing import List, Optional
 
-import requests
+import httpx
+import orjson
 
-from main import normalize_text, haversine_km, Location, ProductResult, SearchFilters
+from main import normalize_text, tokenize_query, Location, ProductResult, SearchFilters, cached_scrape
 
 # API de Algolia para Inkafarma
 ALGOLIA_APP_ID = "15W622LAQ4"
@@ -16,30 +15,45 @@ INKAFARMA_LAT = -12.06
 INKAFARMA_LON = -77.04
 IMAGE_BASE_URL = "https://dcuk1cxrnzjkh.cloudfront.net/imagesproducto/"
 
+# Invariantes de cada resultado: se crean una vez al importar el módulo
+INKAFARMA_LOCATION = Location(lat=INKAFARMA_LAT, lon=INKAFARMA_LON)
+INKAFARMA_PAYMENT_METHODS = ("tarjeta", "efectivo", "online")
 
+# Cliente HTTP/2 compartido: Algolia acepta HTTP/2, así que las búsquedas
+# reutilizan (y multiplexan) una sola conexión TLS
+CLIENT = httpx.Client(
+    headers={
+        "Content-Type": "application/json",
+        "X-Algolia-Application-Id": ALGOLIA_APP_ID,
+        "X-Algolia-API-Key": ALGOLIA_API_KEY,
+    },
+    timeout=20.0,
+    transport=httpx.HTTPTransport(
+        http2=True,
+        retries=2,
+        limits=httpx.Limits(max_keepalive_connections=5),
+    ),
+)
+
+
+@cached_scrape
 def scrape_inkafarma_live(
     query: str,
-    user_location: Optional[Location] = None,
     filters: Optional[SearchFilters] = None,
+    query_tokens: Optional[frozenset] = None,
 ) -> List[ProductResult]:
     """
     Scraper en vivo para Inkafarma (Perú) usando API de Algolia.
     """
-    headers = {
-        "Content-Type": "application/json",
-        "X-Algolia-Application-Id": ALGOLIA_APP_ID,
-        "X-Algolia-API-Key": ALGOLIA_API_KEY,
-    }
-
     body = {
         "query": query,
         "hitsPerPage": 50,
     }
 
     try:
-        resp = requests.post(ALGOLIA_URL, json=body, headers=headers, timeout=20)
+        resp = CLIENT.post(ALGOLIA_URL, content=orjson.dumps(body))
         resp.raise_for_status()
-        data = resp.json()
+        data = orjson.loads(resp.content)
     except Exception as e:
         print(f"Error al conectar con Inkafarma (Algolia): {e}")
         return []
@@ -47,6 +61,15 @@ def scrape_inkafarma_live(
     hits = data.get("hits", [])
 
     results: List[ProductResult] = []
+    # Enlaces locales para el bucle (evita resolver atributos/globales por hit)
+    append_result = results.append
+    normalize = normalize_text
+
+    # Palabras de la query: se calculan una sola vez para todos los hits
+    # (o vienen ya calculadas desde la búsqueda combinada)
+    if query_tokens is None:
+        query_tokens = tokenize_query(query)
+    query_tokens = tuple(t for t in query_tokens if len(t) > 2)
 
     for idx, hit in enumerate(hits, start=1):
         try:
@@ -64,10 +87,8 @@ def scrape_inkafarma_live(
             brand = hit.get("brand", None)
 
             # ========= FILTRO POR PALABRAS (menos estricto, Algolia ya filtra bien) =====
-            full_name = f"{name} {brand or ''}"
-            norm_full_name = normalize_text(full_name)
-
-            query_tokens = [t for t in normalize_text(query).split() if len(t) > 2]
+            full_name = f"{name} {brand}" if brand else name
+            norm_full_name = normalize(full_name)
 
             # Verificar que cada token esté contenido en el nombre (no como palabra exacta)
             if query_tokens and not all(tok in norm_full_name for tok in query_tokens):
@@ -84,6 +105,14 @@ def scrape_inkafarma_live(
 
             price = float(price)
 
+            # ========= FILTROS SIMPLES =========
+            if filters:
+                if filters.max_price is not None and price > filters.max_price:
+                    continue
+                if filters.brand:
+                    if not brand or filters.brand.lower() not in brand.lower():
+                        continue
+
             # ========= IMAGEN =========
             image_url = hit.get("image", None)
             if not image_url:
@@ -95,43 +124,29 @@ def scrape_inkafarma_live(
             uri = hit.get("uri", "")
             product_url = f"https://inkafarma.pe/producto/{uri}" if uri else None
 
-            # ========= FILTROS SIMPLES =========
-            if filters:
-                if filters.max_price is not None and price > filters.max_price:
-                    continue
-                if filters.brand:
-                    if not brand or filters.brand.lower() not in brand.lower():
-                        continue
-
-            # ========= DISTANCIA =========
-            if user_location:
-                distance = haversine_km(
-                    user_location.lat,
-                    user_location.lon,
-                    INKAFARMA_LAT,
-                    INKAFARMA_LON,
-                )
-                distance_km = round(distance, 3)
-            else:
-                distance_km = None
-
-            payment_methods = ["tarjeta", "efectivo", "online"]
+            # ========= CATEGORÍA =========
+            # Algolia la envía como lista; si viene como texto se usa tal cual
+            category = hit.get("category")
+            if isinstance(category, list):
+                category = category[0] if category else None
 
-            results.append(
+            # Campos crudos de Algolia: ProductResult los valida y un hit malformado
+            # cae en el except de abajo en vez de llegar a la respuesta
+            append_result(
                 ProductResult(
                     product_id=idx,
                     name=name,
                     brand=brand,
-                    category=hit.get("category", [None])[0] if hit.get("category") else None,
+                    category=category,
                     image_url=image_url,
                     product_url=product_url,
                     price=price,
                     currency="PEN",
                     store_id=10,
                     store_name="Inkafarma Online",
-                    store_location=Location(lat=INKAFARMA_LAT, lon=INKAFARMA_LON),
-                    distance_km=distance_km,
-                    payment_methods=payment_methods,
+                    store_location=INKAFARMA_LOCATION,
+                    distance_km=None,
+                    payment_methods=list(INKAFARMA_PAYMENT_METHODS),
                 )
             )
 
@@ -139,15 +154,4 @@ def scrape_inkafarma_live(
             print(f"Error procesando producto de Inkafarma: {e}")
             continue
 
-    # Ordenar resultados
-    if user_location:
-        results.sort(
-            key=lambda r: (
-                r.distance_km if r.distance_km is not None else 999999,
-                r.price,
-            )
-        )
-    else:
-        results.sort(key=lambda r: r.price)
-
     return results
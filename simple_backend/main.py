@@ -1,25 +1,43 @@
+import functools
+import heapq
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from operator import attrgetter
+from statistics import median
 
 from fastapi import FastAPI, UploadFile, File, HTTPException, Depends
-from pydantic import BaseModel
-from typing import List, Optional
-from decimal import Decimal
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
 import os
+import re
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from bs4 import BeautifulSoup, SoupStrainer
+import soupsieve as sv
 import unicodedata
 from math import radians, sin, cos, asin, sqrt
-from fuzzywuzzy import fuzz
-from fuzzywuzzy import process
+import numpy as np
+from rapidfuzz import fuzz, process, utils as fuzz_utils
+from cachetools import TTLCache
 
 from sqlalchemy.orm import Session
 from sqlalchemy import or_
 
 from db import SessionLocal, engine, Base
+from migrations import upgrade_schema
 from models import Store, Product, InventoryItem
 
 logger = logging.getLogger("simple_backend")
 
+# Parser HTML en C (lxml) si está instalado; si no, el parser puro de Python
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+
 # Config para Hiraoka (búsqueda en vivo)
 HIRAOKA_BASE_URL = "https://hiraoka.com.pe/gpsearch/"
 HIRAOKA_LAT = -12.06   # aprox Lima centro
@@ -30,6 +48,52 @@ FALABELLA_BASE_URL = "https://www.falabella.com.pe/falabella-pe/search"
 FALABELLA_LAT = -12.06   # Lima aprox
 FALABELLA_LON = -77.04
 
+# Sesión compartida por los scrapers en vivo de Hiraoka y Falabella:
+# reutiliza conexiones TCP/TLS entre búsquedas
+_SCRAPER_SESSION = requests.Session()
+_SCRAPER_SESSION.headers.update({
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/120.0 Safari/537.36"
+    )
+})
+_SCRAPER_SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=10,
+        pool_maxsize=20,
+        max_retries=Retry(total=2, backoff_factor=0.3),
+    ),
+)
+
+# Medios de pago de las tiendas online (Hiraoka/Falabella). Tupla inmutable:
+# cada resultado recibe su propia lista
+LIVE_PAYMENT_METHODS = ("tarjeta", "efectivo")
+
+# Limpieza de precios: deja solo dígitos y punto decimal ("S/ 1,299.00" -> "1299.00")
+PRICE_CLEAN_RE = re.compile(r"[^\d.]")
+
+# Selectores CSS precompilados (se parsean una sola vez, no por cada tarjeta)
+HIRAOKA_CARD_SEL = sv.compile("div.product-item-info[data-container='product-grid']")
+HIRAOKA_NAME_SEL = sv.compile("strong.product.name.product-item-name a.product-item-link")
+HIRAOKA_BRAND_SEL = sv.compile("strong.product.brand.product-item-brand a.product-item-link")
+HIRAOKA_PRICE_SEL = sv.compile("div.price-box [data-price-type='finalPrice']")
+HIRAOKA_PRICE_TEXT_SEL = sv.compile("div.price-box span.price")
+HIRAOKA_IMG_SEL = sv.compile("img.product-image-photo")
+
+FALABELLA_POD_SEL = sv.compile("a[data-pod='catalyst-pod']")
+FALABELLA_BRAND_SEL = sv.compile("b.pod-title")
+FALABELLA_NAME_SEL = sv.compile("b.pod-subTitle")
+FALABELLA_PRICE_SEL = sv.compile("li[data-event-price]")
+FALABELLA_PRICE_SPAN_SEL = sv.compile("span")
+FALABELLA_IMG_SEL = sv.compile("img[alt]")
+
+# Solo se construye en BeautifulSoup el subárbol de cada tarjeta de producto;
+# el resto de la página (menús, scripts, footer) se descarta al parsear
+HIRAOKA_CARD_STRAINER = SoupStrainer("div", attrs={"data-container": "product-grid"})
+FALABELLA_POD_STRAINER = SoupStrainer("a", attrs={"data-pod": "catalyst-pod"})
+
 
 app = FastAPI(
     title="Simple API",
@@ -38,7 +102,26 @@ app = FastAPI(
 )
 
 
+# El seed solo hace falta una vez por proceso: tras comprobarlo, ni /stores
+# ni el arranque vuelven a hacer COUNT(*) sobre la tabla de tiendas
+_SEED_DONE = False
+_SEED_LOCK = threading.Lock()
+
+
 def _seed_default_stores(db: Session) -> int:
+    global _SEED_DONE
+    if _SEED_DONE:
+        return 0
+
+    with _SEED_LOCK:
+        if _SEED_DONE:
+            return 0
+        inserted = _insert_default_stores(db)
+        _SEED_DONE = True
+        return inserted
+
+
+def _insert_default_stores(db: Session) -> int:
     existing = db.query(Store).count()
     if existing > 0:
         return 0
@@ -99,6 +182,18 @@ def _startup_init_db() -> None:
     # Creamos tablas y sembramos tiendas por defecto si es necesario.
     try:
         Base.metadata.create_all(bind=engine)
+    except Exception:
+        logger.exception("DB init failed (continuando sin bloquear el arranque)")
+        return
+
+    # create_all no toca tablas existentes: los índices nuevos van por migración.
+    # Un fallo aquí (p. ej. inventario duplicado) no debe saltarse el seed.
+    try:
+        upgrade_schema(engine)
+    except Exception:
+        logger.exception("Migración de esquema incompleta (continuando sin bloquear el arranque)")
+
+    try:
         db = SessionLocal()
         try:
             inserted = _seed_default_stores(db)
@@ -107,7 +202,7 @@ def _startup_init_db() -> None:
         finally:
             db.close()
     except Exception:
-        logger.exception("DB init/seed failed (continuando sin bloquear el arranque)")
+        logger.exception("DB seed failed (continuando sin bloquear el arranque)")
 
 # ========= DEPENDENCIA DE BD =========
 
@@ -155,6 +250,12 @@ class SearchRequest(BaseModel):
     filters: Optional[SearchFilters] = None
 
 
+class DbSearchRequest(SearchRequest):
+    # Paginación de /search (BD); limit=None devuelve todo
+    limit: Optional[int] = Field(100, ge=1)
+    offset: int = Field(0, ge=0)
+
+
 class SearchResponse(BaseModel):
     results: List[ProductResult]
     total: int
@@ -274,46 +375,232 @@ def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     return R * c
 
 
+def haversine_km_vec(lat1: float, lon1: float, lats2, lons2) -> np.ndarray:
+    """
+    Versión vectorizada (NumPy) de haversine_km: distancias en km desde un
+    punto a muchos puntos (arrays de lat/lon) en una sola pasada.
+    """
+    R = 6371.0  # radio Tierra en km
+    lat1_r, lon1_r = np.radians(lat1), np.radians(lon1)
+    lats2_r, lons2_r = np.radians(lats2), np.radians(lons2)
+    dlat = lats2_r - lat1_r
+    dlon = lons2_r - lon1_r
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1_r) * np.cos(lats2_r) * np.sin(dlon / 2) ** 2
+    return R * 2 * np.arcsin(np.sqrt(a))
+
+
+@functools.lru_cache(maxsize=65536)
 def normalize_text(text: str) -> str:
     """
     Pasa a minúsculas y elimina tildes para comparar texto.
+    Cacheada: nombres, marcas y queries se repiten mucho entre scrapes.
     """
     text = text.lower()
+    # Camino rápido: texto ASCII no tiene tildes que quitar
+    if text.isascii():
+        return text
     text = unicodedata.normalize("NFD", text)
     text = "".join(c for c in text if unicodedata.category(c) != "Mn")
     return text
 
 
+@functools.lru_cache(maxsize=4096)
+def tokenize_query(query: str) -> frozenset:
+    """
+    Conjunto de palabras normalizadas de la query. Cacheado: todos los
+    scrapers y filtros de una misma búsqueda comparten el resultado.
+    """
+    return frozenset(normalize_text(query).split())
+
+
+# Claves de orden en C (attrgetter): con ubicación del usuario todos los
+# resultados traen distance_km, ya que cada tienda tiene coordenadas fijas
+_distance_price_key = attrgetter("distance_km", "price")
+_price_key = attrgetter("price")
+
+
+def sort_results(
+    results: List[ProductResult],
+    user_location: Optional[Location] = None,
+    top_k: Optional[int] = None,
+) -> List[ProductResult]:
+    """
+    Ordena por (distancia, precio) si hay ubicación del usuario, o por precio.
+    Con `top_k` solo devuelve los K primeros usando heapq (O(N log K)).
+    """
+    key = _distance_price_key if user_location else _price_key
+    if top_k is not None:
+        return heapq.nsmallest(top_k, results, key=key)
+    results.sort(key=key)
+    return results
+
+
+def strict_filter(raw_results: List[ProductResult], query: str) -> List[ProductResult]:
+    """
+    Filtro ESTRICTO de los endpoints *-live: TODAS las palabras de la query
+    (de más de 2 letras) deben aparecer en (nombre + marca).
+    """
+    tokens = tuple(t for t in tokenize_query(query) if len(t) > 2)
+    if not tokens:
+        return raw_results
+
+    filtered_results: List[ProductResult] = []
+    for r in raw_results:
+        full_name = f"{r.name} {r.brand}" if r.brand else r.name
+        # normalize_text está cacheada y no toca texto ASCII
+        norm_name = normalize_text(full_name)
+        if all(tok in norm_name for tok in tokens):
+            filtered_results.append(r)
+    return filtered_results
+
+
+# ========= CACHÉ DE SCRAPING =========
+
+# Resultados de scraping por (scraper, palabras de la query, filtros). El catálogo
+# cambia poco, así que 2 minutos bastan para evitar repetir HTTP + parseo.
+SCRAPE_CACHE_TTL = 120
+_SCRAPE_CACHE = TTLCache(maxsize=512, ttl=SCRAPE_CACHE_TTL)
+_SCRAPE_CACHE_LOCK = threading.Lock()
+
+
+def _filters_key(filters: Optional[SearchFilters]):
+    if not filters:
+        return None
+    return (filters.max_price, filters.category, filters.brand, filters.payment_method)
+
+
+def cached_scrape(fn):
+    """
+    Decorador para scrapers en vivo: guarda el resultado sin ubicación en una
+    caché TTL y recalcula la distancia (y el orden) en cada llamada.
+
+    El scraper decorado recibe solo (query, filters[, query_tokens]) y
+    devuelve los productos sin distancia ni orden: eso lo hace el decorador.
+    """
+    @functools.wraps(fn)
+    def wrapper(
+        query: str,
+        user_location: Optional[Location] = None,
+        filters: Optional[SearchFilters] = None,
+        top_k: Optional[int] = None,
+        query_tokens: Optional[frozenset] = None,
+    ) -> List[ProductResult]:
+        # Solo se reenvían las palabras ya calculadas (no todos los scrapers las usan)
+        extra = {"query_tokens": query_tokens} if query_tokens is not None else {}
+        # La clave es la query normalizada, no su conjunto de palabras: el
+        # scraper recibe la query tal cual y la tienda respeta el orden de las
+        # palabras ("funda iphone" y "iphone funda" no traen lo mismo)
+        key = (fn.__name__, normalize_text(query).strip(), _filters_key(filters))
+        with _SCRAPE_CACHE_LOCK:
+            cached = _SCRAPE_CACHE.get(key)
+        if cached is None:
+            cached = fn(query, filters, **extra)
+            # Una lista vacía puede venir de un error de red: no se guarda
+            if cached:
+                with _SCRAPE_CACHE_LOCK:
+                    _SCRAPE_CACHE[key] = cached
+
+        if user_location:
+            distances = {}
+            results = []
+            for r in cached:
+                loc = (r.store_location.lat, r.store_location.lon)
+                if loc not in distances:
+                    distances[loc] = round(
+                        haversine_km(user_location.lat, user_location.lon, *loc), 3
+                    )
+                results.append(r.model_copy(update={"distance_km": distances[loc]}))
+        else:
+            distances = None
+            results = list(cached)
+
+        # Si todos los resultados están a la misma distancia (una sola tienda),
+        # el orden (distancia, precio) es el mismo que solo por precio
+        if distances is not None and len(distances) <= 1:
+            user_location = None
+        return sort_results(results, user_location, top_k)
+
+    return wrapper
+
+
 # ========= FUNCIONES DE IA Y BÚSQUEDA MEJORADA =========
 
+# Sugerencias comunes de productos (ya en minúsculas y sin signos, así que
+# también sirven como choices preprocesadas para RapidFuzz)
+DEFAULT_SUGGESTIONS = (
+    "iphone", "samsung", "huawei", "xiaomi", "motorola", "nokia",
+    "sony", "lg", "panasonic", "tcl", "acer", "asus", "hp", "lenovo",
+    "celular", "smartphone", "tablet", "laptop", "televisor", "tv",
+    "auriculares", "headphones", "smartwatch", "watch", "mica", "protector",
+    "cargador", "cable", "bateria", "funda", "case",
+    "pura", "pro", "ultra", "max", "plus", "lite", "se"
+)
+_DEFAULT_SUGGESTIONS_SET = frozenset(DEFAULT_SUGGESTIONS)
+
+
 def correct_search_query(query: str, suggestions: Optional[List[str]] = None) -> str:
     """
     Corrige errores de ortografía en la búsqueda usando fuzzy matching.
     Si hay sugerencias, intenta hacer match.
     """
     if not suggestions:
-        # Sugerencias comunes de productos
-        suggestions = [
-            "iphone", "samsung", "huawei", "xiaomi", "motorola", "nokia",
-            "sony", "lg", "panasonic", "tcl", "acer", "asus", "hp", "lenovo",
-            "celular", "smartphone", "tablet", "laptop", "televisor", "tv",
-            "auriculares", "headphones", "smartwatch", "watch", "mica", "protector",
-            "cargador", "cable", "bateria", "funda", "case",
-            "pura", "pro", "ultra", "max", "plus", "lite", "se"
-        ]
-    
+        return _correct_with_default_suggestions(query)
+
+    query_lower = query.lower()
+
     # Si la query está muy bien escrita, no hacer nada
-    if query.lower() in [s.lower() for s in suggestions]:
+    if query_lower in {s.lower() for s in suggestions}:
         return query
-    
-    # Buscar la sugerencia más similar
-    best_match = process.extractOne(query.lower(), suggestions, scorer=fuzz.token_set_ratio)
+    # RapidFuzz (C++): mismo scorer que fuzzywuzzy; default_process replica su
+    # full_process y score_cutoff descarta candidatos flojos sin calcular de más
+    best_match = process.extractOne(
+        query_lower,
+        suggestions,
+        scorer=fuzz.token_set_ratio,
+        processor=fuzz_utils.default_process,
+        score_cutoff=80,
+    )
+
     if best_match and best_match[1] > 80:
         return best_match[0]
     
     return query
 
 
+@functools.lru_cache(maxsize=4096)
+def _correct_with_default_suggestions(query: str) -> str:
+    """Corrección contra DEFAULT_SUGGESTIONS, cacheada por query exacta."""
+    query_lower = query.lower()
+
+    # Si la query está muy bien escrita, no hacer nada
+    if query_lower in _DEFAULT_SUGGESTIONS_SET:
+        return query
+    # Las sugerencias por defecto ya están normalizadas: solo se procesa la query
+    best_match = process.extractOne(
+        fuzz_utils.default_process(query_lower),
+        DEFAULT_SUGGESTIONS,
+        scorer=fuzz.token_set_ratio,
+        processor=None,
+        score_cutoff=80,
+    )
+
+    if best_match and best_match[1] > 80:
+        return best_match[0]
+
+    return query
+
+
+# Marcas que, si aparecen en la query, restringen los resultados a esa marca
+BRAND_KEYWORDS = {
+    "apple": "Apple",
+    "samsung": "Samsung",
+    "huawei": "Huawei",
+    "xiaomi": "Xiaomi",
+    "sony": "Sony"
+}
+BRAND_KEYWORDS_SET = frozenset(BRAND_KEYWORDS)
+
+
 def smart_search_filter(products: List['ProductResult'], query: str) -> List['ProductResult']:
     """
     Filtra inteligentemente productos según la query.
@@ -323,34 +610,35 @@ def smart_search_filter(products: List['ProductResult'], query: str) -> List['Pr
     
     # Intenciones de precio
     if any(word in query_lower for word in ["barato", "economico", "oferta", "descuento", "rebajado"]):
-        # Ordenar por precio ascendente
-        products.sort(key=lambda p: p.price)
-        return products[:min(len(products), 10)]
+        # Los 10 más baratos (heap parcial, sin ordenar toda la lista)
+        return heapq.nsmallest(10, products, key=_price_key)
     
     if any(word in query_lower for word in ["premium", "caro", "lujo", "top", "mejor"]):
         # Filtrar productos caros
         threshold = sum(p.price for p in products) / len(products) if products else 0
-        products = [p for p in products if p.price >= threshold]
-        products.sort(key=lambda p: p.price, reverse=True)
-        return products[:min(len(products), 10)]
-    
-    # Intenciones de marca
-    brand_keywords = {
-        "apple": "Apple",
-        "samsung": "Samsung",
-        "huawei": "Huawei",
-        "xiaomi": "Xiaomi",
-        "sony": "Sony"
-    }
+        # Los 10 más caros por encima del promedio (heap parcial)
+        return heapq.nlargest(
+            10, (p for p in products if p.price >= threshold), key=_price_key
+        )
     
-    for keyword, brand in brand_keywords.items():
-        if keyword in query_lower:
-            products = [p for p in products if p.brand and brand.lower() in p.brand.lower()]
-            return products
+    # Intenciones de marca: intersección de palabras de la query con las marcas
+    hits = BRAND_KEYWORDS_SET.intersection(query_lower.split())
+    if hits:
+        # Si hay varias, gana la primera según el orden de BRAND_KEYWORDS
+        brand_lower = next(BRAND_KEYWORDS[k] for k in BRAND_KEYWORDS if k in hits).lower()
+        return [p for p in products if p.brand and brand_lower in p.brand.lower()]
     
     return products
 
 
+def group_by_normalized_name(products: List[ProductResult]) -> Dict[str, List[ProductResult]]:
+    """Agrupa productos por nombre normalizado, en una sola pasada."""
+    groups: Dict[str, List[ProductResult]] = {}
+    for product in products:
+        groups.setdefault(normalize_text(product.name), []).append(product)
+    return groups
+
+
 def get_price_comparison(products: List[ProductResult], product_name: str) -> Optional[PriceComparison]:
     """
     Compara precios del mismo producto en diferentes tiendas.
@@ -358,20 +646,25 @@ def get_price_comparison(products: List[ProductResult], product_name: str) -> Op
     if not products:
         return None
     
-    # Agrupar por nombre normalizado
+    # Una sola pasada: filtra por nombre normalizado y acumula min/max/suma
     norm_name = normalize_text(product_name)
-    matching_products = [
-        p for p in products 
-        if normalize_text(p.name) == norm_name or normalize_text(f"{p.name} {p.brand or ''}") == norm_name
-    ]
+    matching_products = []
+    cheapest = most_expensive = None
+    total = 0.0
+    for p in products:
+        if normalize_text(p.name) != norm_name and (not p.brand or normalize_text(f"{p.name} {p.brand}") != norm_name):
+            continue
+        matching_products.append(p)
+        total += p.price
+        if cheapest is None or p.price < cheapest.price:
+            cheapest = p
+        if most_expensive is None or p.price > most_expensive.price:
+            most_expensive = p
     
     if len(matching_products) < 2:
         return None
     
-    prices = [p.price for p in matching_products]
-    cheapest = min(matching_products, key=lambda p: p.price)
-    most_expensive = max(matching_products, key=lambda p: p.price)
-    average_price = sum(prices) / len(prices)
+    average_price = total / len(matching_products)
     price_difference = most_expensive.price - cheapest.price
     savings_percentage = (price_difference / most_expensive.price) * 100 if most_expensive.price > 0 else 0
     
@@ -394,25 +687,24 @@ def get_price_statistics(products: List[ProductResult], product_name: str) -> Op
     if not products:
         return None
     
+    # Una sola pasada: filtra por nombre normalizado, junta precios y tiendas
     norm_name = normalize_text(product_name)
-    matching_products = [
-        p for p in products 
-        if normalize_text(p.name) == norm_name or normalize_text(f"{p.name} {p.brand or ''}") == norm_name
-    ]
+    prices = []
+    stores_dict = {}
+    for p in products:
+        if normalize_text(p.name) != norm_name and (not p.brand or normalize_text(f"{p.name} {p.brand}") != norm_name):
+            continue
+        prices.append(p.price)
+        stores_dict[p.store_name] = p.price
     
-    if not matching_products:
+    if not prices:
         return None
     
-    prices = sorted([p.price for p in matching_products])
     count = len(prices)
     min_price = min(prices)
     max_price = max(prices)
     average_price = sum(prices) / count
-    median_price = prices[count // 2] if count % 2 == 1 else (prices[count // 2 - 1] + prices[count // 2]) / 2
-    
-    stores_dict = {}
-    for p in matching_products:
-        stores_dict[p.store_name] = p.price
+    median_price = median(prices)
     
     return PriceStatistics(
         product_name=product_name,
@@ -434,13 +726,15 @@ def generate_recommendations(products: List[ProductResult], query: str) -> List[
     if not products:
         return recommendations
     
+    # Precio promedio: es el mismo para todos los productos, se calcula una vez
+    avg_price = sum(p.price for p in products) / len(products)
+
     # Calcular scores para cada producto
     for idx, product in enumerate(products[:10]):  # Top 10
         score = 100
         reason = []
         
         # Puntos por precio
-        avg_price = sum(p.price for p in products) / len(products)
         if product.price < avg_price * 0.8:
             score += 20
             reason.append("Muy buen precio")
@@ -472,88 +766,64 @@ def generate_recommendations(products: List[ProductResult], query: str) -> List[
 
 # ========= SCRAPER HIRAOKA (LIVE, SIN BD) =========
 
+# Invariantes de cada resultado: se crean una vez al importar el módulo
+HIRAOKA_LOCATION = Location(lat=HIRAOKA_LAT, lon=HIRAOKA_LON)
+FALABELLA_LOCATION = Location(lat=FALABELLA_LAT, lon=FALABELLA_LON)
+
+@cached_scrape
 def scrape_hiraoka_live(
     query: str,
-    user_location: Optional[Location] = None,
     filters: Optional[SearchFilters] = None,
 ) -> List[ProductResult]:
     """
     Llama a la web de Hiraoka en tiempo real y devuelve productos tal cual,
     sin aplicar todavía el filtro estricto de texto.
     """
-    headers = {
-        "User-Agent": (
-            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-            "AppleWebKit/537.36 (KHTML, like Gecko) "
-            "Chrome/120.0 Safari/537.36"
-        )
-    }
     params = {"q": query}
 
-    resp = requests.get(HIRAOKA_BASE_URL, params=params, headers=headers, timeout=20)
+    resp = _SCRAPER_SESSION.get(HIRAOKA_BASE_URL, params=params, timeout=20)
     resp.raise_for_status()
 
-    soup = BeautifulSoup(resp.text, "html.parser")
+    # Bytes crudos: el parser detecta la codificación y evitamos que requests
+    # la adivine con charset-normalizer al construir resp.text
+    soup = BeautifulSoup(resp.content, HTML_PARSER, parse_only=HIRAOKA_CARD_STRAINER)
 
     # Cada producto está en:
     # <div class="product-item-info" data-container="product-grid">
-    cards = soup.select("div.product-item-info[data-container='product-grid']")
+    # (iselect: generador, no arma la lista completa de tarjetas)
+    cards = HIRAOKA_CARD_SEL.iselect(soup)
 
     results: List[ProductResult] = []
 
     for idx, card in enumerate(cards, start=1):
         # ===== Nombre =====
-        name_el = card.select_one(
-            "strong.product.name.product-item-name a.product-item-link"
-        )
+        name_el = HIRAOKA_NAME_SEL.select_one(card)
         if not name_el:
             continue
         name = name_el.get_text(strip=True)
 
-        href = name_el.get("href") if hasattr(name_el, "get") else None
-        if href and isinstance(href, str):
-            href = href.strip()
-        if href and href.startswith("/"):
-            product_url = f"https://hiraoka.com.pe{href}"
-        else:
-            product_url = href if href else None
-
         # ===== Marca =====
-        brand_el = card.select_one(
-            "strong.product.brand.product-item-brand a.product-item-link"
-        )
+        brand_el = HIRAOKA_BRAND_SEL.select_one(card)
         brand = brand_el.get_text(strip=True) if brand_el else None
 
         # ===== Precio =====
-        price_span = card.select_one("div.price-box [data-price-type='finalPrice']")
+        price_span = HIRAOKA_PRICE_SEL.select_one(card)
         amount_str = None
 
         if price_span and price_span.get("data-price-amount"):
             amount_str = price_span["data-price-amount"].strip()
         else:
-            price_text_el = card.select_one("div.price-box span.price")
+            price_text_el = HIRAOKA_PRICE_TEXT_SEL.select_one(card)
             if not price_text_el:
                 continue
             price_text = price_text_el.get_text(strip=True)
-            digits = (
-                price_text.replace("S/", "")
-                .replace("S/.", "")
-                .replace("s/", "")
-                .replace("\xa0", " ")
-                .replace(" ", "")
-                .replace(",", "")
-            )
-            amount_str = digits
+            amount_str = PRICE_CLEAN_RE.sub("", price_text)
 
         try:
-            price = float(Decimal(amount_str))
-        except Exception:
+            price = float(amount_str)
+        except ValueError:
             continue
 
-        # ===== Imagen =====
-        img_el = card.select_one("img.product-image-photo")
-        image_url = img_el["src"] if img_el and img_el.get("src") else None
-
         # ===== Filtros simples por precio y marca (si vienen) =====
         if filters:
             if filters.max_price is not None and price > filters.max_price:
@@ -562,22 +832,22 @@ def scrape_hiraoka_live(
                 if not brand or filters.brand.lower() not in brand.lower():
                     continue
 
-        # ===== Distancia (opcional) =====
-        if user_location:
-            distance = haversine_km(
-                user_location.lat,
-                user_location.lon,
-                HIRAOKA_LAT,
-                HIRAOKA_LON,
-            )
-            distance_km = round(distance, 3)
+        # ===== URL del producto =====
+        href = name_el.get("href") if hasattr(name_el, "get") else None
+        if href and isinstance(href, str):
+            href = href.strip()
+        if href and href.startswith("/"):
+            product_url = f"https://hiraoka.com.pe{href}"
         else:
-            distance_km = None
+            product_url = href if href else None
 
-        payment_methods = ["tarjeta", "efectivo"]
+        # ===== Imagen =====
+        img_el = HIRAOKA_IMG_SEL.select_one(card)
+        image_url = img_el["src"] if img_el and img_el.get("src") else None
 
+        # Datos ya tipados por el scraper: model_construct evita revalidarlos
         results.append(
-            ProductResult(
+            ProductResult.model_construct(
                 product_id=idx,
                 name=name,
                 brand=brand,
@@ -588,29 +858,19 @@ def scrape_hiraoka_live(
                 currency="PEN",
                 store_id=1,
                 store_name="Hiraoka Online",
-                store_location=Location(lat=HIRAOKA_LAT, lon=HIRAOKA_LON),
-                distance_km=distance_km,
-                payment_methods=payment_methods,
+                store_location=HIRAOKA_LOCATION,
+                distance_km=None,
+                payment_methods=list(LIVE_PAYMENT_METHODS),
             )
         )
 
-    # Orden básico
-    if user_location:
-        results.sort(
-            key=lambda r: (
-                r.distance_km if r.distance_km is not None else 999999,
-                r.price,
-            )
-        )
-    else:
-        results.sort(key=lambda r: r.price)
-
     return results
 
+@cached_scrape
 def scrape_falabella_live(
     query: str,
-    user_location: Optional[Location] = None,
     filters: Optional[SearchFilters] = None,
+    query_tokens: Optional[frozenset] = None,
 ) -> List[ProductResult]:
     """
     Scraper en vivo para Falabella Perú (estructura nueva 2025).
@@ -621,96 +881,60 @@ def scrape_falabella_live(
       - Precio en li[data-event-price]
     NO toca la BD.
     """
-    headers = {
-        "User-Agent": (
-            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-            "AppleWebKit/537.36 (KHTML, like Gecko) "
-            "Chrome/120.0 Safari/537.36"
-        )
-    }
 
     # Falabella usa 'Ntt' como parámetro de texto
     params = {"Ntt": query}
 
-    resp = requests.get(FALABELLA_BASE_URL, params=params, headers=headers, timeout=20)
+    resp = _SCRAPER_SESSION.get(FALABELLA_BASE_URL, params=params, timeout=20)
     resp.raise_for_status()
 
-    soup = BeautifulSoup(resp.text, "html.parser")
+    soup = BeautifulSoup(resp.content, HTML_PARSER, parse_only=FALABELLA_POD_STRAINER)
 
-    # Seleccionar todos los pods de productos (nueva estructura)
-    product_pods = soup.select("a[data-pod='catalyst-pod']")
+    # Recorrer los pods de productos (nueva estructura) de forma perezosa
+    product_pods = FALABELLA_POD_SEL.iselect(soup)
 
     results: List[ProductResult] = []
 
+    # Partimos la query en palabras (una sola vez para todos los pods),
+    # salvo que la búsqueda combinada ya las haya calculado
+    if query_tokens is None:
+        query_tokens = tokenize_query(query)
+
     for idx, pod in enumerate(product_pods, start=1):
-        href = pod.get("href") if hasattr(pod, "get") else None
-        if href and isinstance(href, str):
-            href = href.strip()
-        if href and href.startswith("/"):
-            product_url = f"https://www.falabella.com.pe{href}"
-        else:
-            product_url = href if href else None
         # ========= MARCA =========
-        brand_el = pod.select_one("b.pod-title")
+        brand_el = FALABELLA_BRAND_SEL.select_one(pod)
         brand = brand_el.get_text(strip=True) if brand_el else None
 
         # ========= NOMBRE (subtítulo) =========
-        name_el = pod.select_one("b.pod-subTitle")
+        name_el = FALABELLA_NAME_SEL.select_one(pod)
         if not name_el:
             # sin nombre, no tiene sentido
             continue
         name = name_el.get_text(strip=True)
 
-        # ========= FILTRO ESTRICTO POR PALABRAS DE LA QUERY =====
-        # Unimos nombre + marca y normalizamos (minúsculas, sin tildes)
-        full_name = f"{name} {brand or ''}"
-        norm_full_name = normalize_text(full_name)
-
-        # Partimos la query en palabras
-        query_tokens = [
-            t for t in normalize_text(query).split()
-        ]
-
-        # Si quieres que TODAS las palabras de la query aparezcan como palabras EXACTAS en el nombre+marca:
-        full_name_words = norm_full_name.split()
-        if query_tokens and not all(tok in full_name_words for tok in query_tokens):
-            # Este producto no cumple con la búsqueda estricta, lo saltamos
-            continue
-
         # ========= PRECIO =========
         # <li data-event-price="2,499" class="... prices-0">...</li>
-        price_li = pod.select_one("li[data-event-price]")
+        price_li = FALABELLA_PRICE_SEL.select_one(pod)
         if not price_li:
             continue
 
         amount_str = price_li.get("data-event-price", "").strip()
         if not amount_str:
             # fallback: leer texto S/  2,499
-            price_span = price_li.select_one("span")
+            price_span = FALABELLA_PRICE_SPAN_SEL.select_one(price_li)
             if not price_span:
                 continue
             price_text = price_span.get_text(strip=True)
-            digits = (
-                price_text.replace("S/", "")
-                .replace("S/.", "")
-                .replace("s/", "")
-                .replace("\xa0", " ")
-                .replace(" ", "")
-                .replace(",", "")
-            )
-            amount_str = digits
+            amount_str = PRICE_CLEAN_RE.sub("", price_text)
 
         try:
-            price = float(Decimal(amount_str.replace(",", "")))
-        except Exception:
+            price = float(PRICE_CLEAN_RE.sub("", amount_str))
+        except ValueError:
             continue
 
-        # ========= IMAGEN =========
-        # <img src="..." alt="...">
-        img_el = pod.select_one("img[alt]")
-        image_url = img_el["src"] if img_el and img_el.get("src") else None
-
         # ========= FILTROS SIMPLES (precio/marca) =========
+        # Van antes del filtro por palabras: son comparaciones baratas y evitan
+        # normalizar el nombre de productos que igual se descartarían
         if filters:
             if filters.max_price is not None and price > filters.max_price:
                 continue
@@ -718,22 +942,34 @@ def scrape_falabella_live(
                 if not brand or filters.brand.lower() not in brand.lower():
                     continue
 
-        # ========= DISTANCIA AL USUARIO (opcional) =========
-        if user_location:
-            distance = haversine_km(
-                user_location.lat,
-                user_location.lon,
-                FALABELLA_LAT,
-                FALABELLA_LON,
-            )
-            distance_km = round(distance, 3)
+        # ========= FILTRO ESTRICTO POR PALABRAS DE LA QUERY =====
+        # Unimos nombre + marca y normalizamos (minúsculas, sin tildes)
+        full_name = f"{name} {brand}" if brand else name
+        norm_full_name = normalize_text(full_name)
+
+        # Si quieres que TODAS las palabras de la query aparezcan como palabras EXACTAS en el nombre+marca:
+        full_name_words = frozenset(norm_full_name.split())
+        if query_tokens and not query_tokens.issubset(full_name_words):
+            # Este producto no cumple con la búsqueda estricta, lo saltamos
+            continue
+
+        # ========= URL DEL PRODUCTO =========
+        href = pod.get("href") if hasattr(pod, "get") else None
+        if href and isinstance(href, str):
+            href = href.strip()
+        if href and href.startswith("/"):
+            product_url = f"https://www.falabella.com.pe{href}"
         else:
-            distance_km = None
+            product_url = href if href else None
 
-        payment_methods = ["tarjeta", "efectivo"]
+        # ========= IMAGEN =========
+        # <img src="..." alt="...">
+        img_el = FALABELLA_IMG_SEL.select_one(pod)
+        image_url = img_el["src"] if img_el and img_el.get("src") else None
 
+        # Datos ya tipados por el scraper: model_construct evita revalidarlos
         results.append(
-            ProductResult(
+            ProductResult.model_construct(
                 product_id=idx,  # id artificial para esta respuesta
                 name=name,
                 brand=brand,
@@ -744,26 +980,131 @@ def scrape_falabella_live(
                 currency="PEN",
                 store_id=2,
                 store_name="Falabella Online",
-                store_location=Location(lat=FALABELLA_LAT, lon=FALABELLA_LON),
-                distance_km=distance_km,
-                payment_methods=payment_methods,
+                store_location=FALABELLA_LOCATION,
+                distance_km=None,
+                payment_methods=list(LIVE_PAYMENT_METHODS),
             )
         )
 
-    # Orden básico
-    if user_location:
-        results.sort(
-            key=lambda r: (
-                r.distance_km if r.distance_km is not None else 999999,
-                r.price,
-            )
-        )
-    else:
-        results.sort(key=lambda r: r.price)
+    return results
+
 
+
+# ========= SCRAPING CONCURRENTE =========
+
+# Scrapers en módulos propios: se importan una vez al cargar la app. Van aquí y
+# no arriba porque esos módulos importan utilidades de main (definidas antes).
+# Si alguno no está disponible queda en None y se omite.
+try:
+    from vtex_scraper import scrape_vtex_catalog_live
+except ImportError:
+    logger.warning("VTEX scraper no disponible")
+    scrape_vtex_catalog_live = None
+
+try:
+    from inkafarma_scraper import scrape_inkafarma_live
+except ImportError:
+    logger.warning("Inkafarma scraper no disponible")
+    scrape_inkafarma_live = None
+
+try:
+    from mifarma_scraper import scrape_mifarma_live
+except ImportError:
+    logger.warning("Mifarma scraper no disponible")
+    scrape_mifarma_live = None
+
+# Tiempo máximo (segundos) que una búsqueda multi-tienda espera a sus scrapers,
+# contado desde que se lanzan; una tienda lenta no debe retrasar al resto
+SCRAPE_TIMEOUT = 25
+
+# Pool compartido entre requests y acotado: los scrapers son I/O-bound, así que
+# los hilos se solapan mientras esperan la red. Da para varias búsquedas
+# multi-tienda a la vez (cada una lanza ~7 scrapers) sin crear hilos por request.
+SCRAPE_WORKERS = 32
+_SCRAPE_POOL = ThreadPoolExecutor(max_workers=SCRAPE_WORKERS, thread_name_prefix="scrape")
+
+
+def run_scrapers(scrapers, **common) -> List[ProductResult]:
+    """
+    Ejecuta varios scrapers en paralelo y concatena sus resultados.
+    `scrapers` es una lista de (funcion, kwargs_extra); `common` se pasa a todos.
+    Se respeta el orden de la lista; si un scraper falla o no responde
+    dentro de SCRAPE_TIMEOUT, se ignora.
+    """
+    futures = [_SCRAPE_POOL.submit(fn, **common, **extra) for fn, extra in scrapers]
+    done, _ = wait(futures, timeout=SCRAPE_TIMEOUT)
+
+    results: List[ProductResult] = []
+    for (fn, extra), future in zip(scrapers, futures):
+        # Las tiendas VTEX comparten función: se identifican por su nombre
+        store = extra.get("store_name", fn.__name__)
+        if future not in done:
+            # Si aún está en cola no llega a ejecutarse; si ya corre, termina en
+            # el pool (acotado por el timeout HTTP del scraper) y se descarta
+            future.cancel()
+            logger.warning(
+                "%s sin respuesta en %ss (se omiten sus resultados)",
+                store, SCRAPE_TIMEOUT,
+            )
+            continue
+        try:
+            results.extend(future.result())
+        except Exception:
+            logger.exception("Scraper de %s falló (se omiten sus resultados)", store)
     return results
 
 
+# Tiendas VTEX consultadas en vivo (mismo scraper, distinto origen)
+VTEX_STORES = (
+    {"store_name": "Promart", "store_id": 5, "base_origin": "https://www.promart.pe"},
+    {"store_name": "Oechsle", "store_id": 6, "base_origin": "https://www.oechsle.pe"},
+    {"store_name": "PlazaVea", "store_id": 7, "base_origin": "https://www.plazavea.com.pe"},
+)
+VTEX_STORE_LAT = -12.06
+VTEX_STORE_LON = -77.04
+
+
+def scrape_all_stores(
+    query: str,
+    user_location: Optional[Location] = None,
+    filters: Optional[SearchFilters] = None,
+    include_inkafarma: bool = False,
+) -> List[ProductResult]:
+    """
+    Scrapea Hiraoka, Falabella, las tiendas VTEX (y opcionalmente Inkafarma)
+    en paralelo. Los resultados vienen en ese orden de tiendas.
+    """
+    # Las palabras de la query se normalizan una sola vez y se comparten
+    # entre los scrapers que filtran por palabras
+    query_tokens = tokenize_query(query)
+    scrapers = [
+        (scrape_hiraoka_live, {}),
+        (scrape_falabella_live, {"query_tokens": query_tokens}),
+    ]
+
+    if scrape_vtex_catalog_live is not None:
+        scrapers += [
+            (
+                scrape_vtex_catalog_live,
+                {
+                    **store,
+                    "store_lat": VTEX_STORE_LAT,
+                    "store_lon": VTEX_STORE_LON,
+                    "query_tokens": query_tokens,
+                },
+            )
+            for store in VTEX_STORES
+        ]
+
+    if include_inkafarma and scrape_inkafarma_live is not None:
+        scrapers.append((scrape_inkafarma_live, {"query_tokens": query_tokens}))
+
+    return run_scrapers(
+        scrapers,
+        query=query,
+        user_location=user_location,
+        filters=filters,
+    )
 
 # ========= ENDPOINTS: TIENDAS =========
 
@@ -801,7 +1142,7 @@ def create_store(store: StoreCreate, db: Session = Depends(get_db)):
 @app.get("/stores", response_model=List[StoreOut])
 def list_stores(db: Session = Depends(get_db)):
     stores = db.query(Store).all()
-    if not stores:
+    if not stores and not _SEED_DONE:
         try:
             inserted = _seed_default_stores(db)
             if inserted:
@@ -879,6 +1220,20 @@ def create_inventory_item(item: InventoryCreate, db: Session = Depends(get_db)):
     if not product:
         raise HTTPException(status_code=400, detail="El producto no existe")
 
+    existing = (
+        db.query(InventoryItem)
+        .filter(
+            InventoryItem.store_id == item.store_id,
+            InventoryItem.product_id == item.product_id,
+        )
+        .first()
+    )
+    if existing:
+        raise HTTPException(
+            status_code=400,
+            detail="Ya existe inventario para ese producto en esa tienda",
+        )
+
     db_item = InventoryItem(
         store_id=item.store_id,
         product_id=item.product_id,
@@ -919,12 +1274,26 @@ def list_inventory_items(db: Session = Depends(get_db)):
 # ========= ENDPOINT: BÚSQUEDA SOBRE BD =========
 
 @app.post("/search", response_model=SearchResponse)
-def search_products(payload: SearchRequest, db: Session = Depends(get_db)):
+def search_products(payload: DbSearchRequest, db: Session = Depends(get_db)):
     """
     Búsqueda directa sobre la BD local (productos que tú hayas cargado).
     """
+    # Solo las columnas que se usan: filas-tupla livianas, sin hidratar objetos ORM
     q = (
-        db.query(InventoryItem, Product, Store)
+        db.query(
+            InventoryItem.price,
+            InventoryItem.currency,
+            Product.id.label("product_id"),
+            Product.name,
+            Product.brand,
+            Product.category,
+            Product.image_url,
+            Store.id.label("store_id"),
+            Store.name.label("store_name"),
+            Store.latitude,
+            Store.longitude,
+            Store.payment_methods,
+        )
         .join(Product, InventoryItem.product_id == Product.id)
         .join(Store, InventoryItem.store_id == Store.id)
     )
@@ -951,339 +1320,147 @@ def search_products(payload: SearchRequest, db: Session = Depends(get_db)):
             pattern_pm = f"%{f.payment_method}%"
             q = q.filter(Store.payment_methods.ilike(pattern_pm))
 
-    rows = q.all()
-
-    results: List[ProductResult] = []
-    for inv, prod, store in rows:
-        if payload.user_location:
-            distance = haversine_km(
-                payload.user_location.lat,
-                payload.user_location.lon,
-                store.latitude,
-                store.longitude,
-            )
-            distance_km = round(distance, 3)
+    # Sin ubicación el orden es solo por precio: se pagina directamente en SQL
+    # (el id desempata para que las páginas no se solapen).
+    # Con ubicación el orden depende de la distancia, que se calcula en Python.
+    if not payload.user_location:
+        page = q.order_by(InventoryItem.price, InventoryItem.id).offset(payload.offset)
+        if payload.limit is not None:
+            page = page.limit(payload.limit)
+        rows = page.all()
+        # Una página incompleta ya dice cuántas coincidencias hay; si no, COUNT(*)
+        # sobre la misma consulta filtrada
+        if (rows or not payload.offset) and (payload.limit is None or len(rows) < payload.limit):
+            total = payload.offset + len(rows)
         else:
-            distance_km = None
+            total = q.count()
+    else:
+        # Orden de entrada fijo: lexsort es estable, así que los empates en
+        # (distancia, precio) quedan por id y las páginas no se solapan
+        rows = q.order_by(InventoryItem.id).all()
+        # Coincidencias antes de paginar (la página se recorta más abajo)
+        total = len(rows)
+
+    # Datos por tienda (ubicación y medios de pago) una sola vez por tienda
+    stores = {}
+    for row in rows:
+        if row.store_id not in stores:
+            stores[row.store_id] = (
+                Location.model_construct(lat=row.latitude, lon=row.longitude),
+                row.payment_methods.split(",") if row.payment_methods else [],
+            )
 
-        methods = store.payment_methods.split(",") if store.payment_methods else []
+    # Distancias: una sola pasada vectorizada sobre las tiendas distintas
+    distances = {}
+    if payload.user_location and stores:
+        store_ids = list(stores)
+        dists = haversine_km_vec(
+            payload.user_location.lat,
+            payload.user_location.lon,
+            np.array([stores[i][0].lat for i in store_ids], dtype=np.float64),
+            np.array([stores[i][0].lon for i in store_ids], dtype=np.float64),
+        )
+        distances = dict(zip(store_ids, np.round(dists, 3).tolist()))
 
-        results.append(
-            ProductResult(
-                product_id=prod.id,
-                name=prod.name,
-                brand=prod.brand,
-                category=prod.category,
-                image_url=prod.image_url,
-                price=float(inv.price),
-                currency=inv.currency,
-                store_id=store.id,
-                store_name=store.name,
-                store_location=Location(lat=store.latitude, lon=store.longitude),
-                distance_km=distance_km,
-                payment_methods=methods,
-            )
+        # Orden por (distancia, precio) sobre arreglos NumPy (lexsort es estable,
+        # igual que el sort de Python) y paginación antes de armar los resultados:
+        # solo se construyen los ProductResult de la página pedida
+        row_distances = np.fromiter(
+            (distances[row.store_id] for row in rows), dtype=np.float64, count=len(rows)
         )
+        row_prices = np.fromiter(
+            (float(row.price) for row in rows), dtype=np.float64, count=len(rows)
+        )
+        order = np.lexsort((row_prices, row_distances))
+        end = payload.offset + payload.limit if payload.limit is not None else None
+        rows = [rows[i] for i in order[payload.offset:end].tolist()]
+
+    results: List[ProductResult] = []
+    for row in rows:
+        store_location, methods = stores[row.store_id]
 
-    if payload.user_location:
-        results.sort(
-            key=lambda r: (
-                r.distance_km if r.distance_km is not None else 999999,
-                r.price,
+        # Filas de nuestra propia BD (tipos garantizados por el esquema):
+        # model_construct evita la validación de Pydantic por fila
+        results.append(
+            ProductResult.model_construct(
+                product_id=row.product_id,
+                name=row.name,
+                brand=row.brand,
+                category=row.category,
+                image_url=row.image_url,
+                price=float(row.price),
+                currency=row.currency,
+                store_id=row.store_id,
+                store_name=row.store_name,
+                store_location=store_location,
+                distance_km=distances.get(row.store_id),
+                payment_methods=methods,
             )
         )
-    else:
-        results.sort(key=lambda r: r.price)
 
     message = "OK" if results else "Sin resultados para esta búsqueda"
 
-    return SearchResponse(results=results, total=len(results), message=message)
+    return SearchResponse(results=results, total=total, message=message)
 
 
-# ========= ENDPOINT: BÚSQUEDA HIRAOKA EN VIVO (CON FILTRO ESTRICTO) =========
+# ========= ENDPOINTS: BÚSQUEDA EN VIVO POR TIENDA (CON FILTRO ESTRICTO) =========
 
-@app.post("/search/hiraoka-live", response_model=SearchResponse)
-def search_hiraoka_live(payload: SearchRequest):
-    """
-    Búsqueda en tiempo real en Hiraoka (sin usar la base de datos),
-    con filtro ESTRICTO por las palabras que escribió el usuario.
-    """
-    if not payload.query:
-        raise HTTPException(
-            status_code=400,
-            detail="Por ahora 'query' es obligatorio para la búsqueda en Hiraoka.",
+# slug de la URL -> (nombre visible, scraper (None = no disponible),
+# argumentos propios de la tienda)
+LIVE_STORES = {
+    "hiraoka": ("Hiraoka", scrape_hiraoka_live, {}),
+    "falabella": ("Falabella", scrape_falabella_live, {}),
+    "inkafarma": ("Inkafarma", scrape_inkafarma_live, {}),
+    "mifarma": ("Mifarma", scrape_mifarma_live, {}),
+    **{
+        store["store_name"].lower(): (
+            store["store_name"],
+            scrape_vtex_catalog_live,
+            {**store, "store_lat": VTEX_STORE_LAT, "store_lon": VTEX_STORE_LON},
         )
+        for store in VTEX_STORES
+    },
+}
 
-    # 1) Scraping crudo (trae todo lo que devuelve Hiraoka para ese q)
-    raw_results = scrape_hiraoka_live(
-        query=payload.query,
-        user_location=payload.user_location,
-        filters=payload.filters,
-    )
-
-    # 2) Normalizamos la query y la rompemos en palabras (ignorando palabras muy cortas)
-    norm_query = normalize_text(payload.query)
-    tokens = [t for t in norm_query.split() if len(t) > 2]
-
-    # 3) Filtro estricto: TODAS las palabras deben aparecer en (nombre + marca)
-    if tokens:
-        filtered_results: List[ProductResult] = []
-        for r in raw_results:
-            full_name = f"{r.name} {r.brand or ''}"
-            norm_name = normalize_text(full_name)
-            if all(tok in norm_name for tok in tokens):
-                filtered_results.append(r)
-        results = filtered_results
-    else:
-        results = raw_results
 
-    message = "OK" if results else "Sin resultados para esta búsqueda en Hiraoka"
-
-    return SearchResponse(results=results, total=len(results), message=message)
-
-
-@app.post("/search/falabella-live", response_model=SearchResponse)
-def search_falabella_live_endpoint(payload: SearchRequest):
+@app.post("/search/{store}-live", response_model=SearchResponse)
+def search_store_live(store: str, payload: SearchRequest):
     """
-    Búsqueda en tiempo real en Falabella (sin usar la base),
-    con el mismo filtro ESTRICTO de palabras que usamos en Hiraoka.
+    Búsqueda en tiempo real en una tienda (sin usar la base de datos),
+    con filtro ESTRICTO por las palabras que escribió el usuario.
+    Tiendas: hiraoka, falabella, inkafarma, mifarma, promart, oechsle, plazavea.
     """
-    if not payload.query:
-        raise HTTPException(
-            status_code=400,
-            detail="Por ahora 'query' es obligatorio para la búsqueda en Falabella.",
-        )
-
-    # 1) Scraping crudo de Falabella
-    raw_results = scrape_falabella_live(
-        query=payload.query,
-        user_location=payload.user_location,
-        filters=payload.filters,
-    )
-
-    # 2) Filtro estricto por las palabras escritas por el usuario
-    norm_query = normalize_text(payload.query)
-    tokens = [t for t in norm_query.split() if len(t) > 2]
-
-    if tokens:
-        filtered_results: List[ProductResult] = []
-        for r in raw_results:
-            full_name = f"{r.name} {r.brand or ''}"
-            norm_name = normalize_text(full_name)
-            if all(tok in norm_name for tok in tokens):
-                filtered_results.append(r)
-        results = filtered_results
-    else:
-        results = raw_results
-
-    message = "OK" if results else "Sin resultados para esta búsqueda en Falabella"
+    if store not in LIVE_STORES:
+        raise HTTPException(status_code=404, detail=f"Tienda '{store}' no soportada")
+    label, scraper, store_kwargs = LIVE_STORES[store]
 
-    return SearchResponse(results=results, total=len(results), message=message)
-
-
-@app.post("/search/inkafarma-live", response_model=SearchResponse)
-def search_inkafarma_live_endpoint(payload: SearchRequest):
-    """Búsqueda en tiempo real en Inkafarma (sin usar la base), con filtro ESTRICTO."""
-    if not payload.query:
-        raise HTTPException(
-            status_code=400,
-            detail="Por ahora 'query' es obligatorio para la búsqueda en Inkafarma.",
-        )
-
-    try:
-        from inkafarma_scraper import scrape_inkafarma_live
-    except ImportError:
-        raise HTTPException(status_code=503, detail="Scraper de Inkafarma no disponible")
-
-    raw_results = scrape_inkafarma_live(
-        query=payload.query,
-        user_location=payload.user_location,
-        filters=payload.filters,
-    )
-
-    norm_query = normalize_text(payload.query)
-    tokens = [t for t in norm_query.split() if len(t) > 2]
-
-    if tokens:
-        filtered_results: List[ProductResult] = []
-        for r in raw_results:
-            full_name = f"{r.name} {r.brand or ''}"
-            norm_name = normalize_text(full_name)
-            if all(tok in norm_name for tok in tokens):
-                filtered_results.append(r)
-        results = filtered_results
-    else:
-        results = raw_results
-
-    message = "OK" if results else "Sin resultados para esta búsqueda en Inkafarma"
-    return SearchResponse(results=results, total=len(results), message=message)
-
-
-@app.post("/search/mifarma-live", response_model=SearchResponse)
-def search_mifarma_live_endpoint(payload: SearchRequest):
-    """Búsqueda en tiempo real en Mifarma (Algolia), con filtro ESTRICTO."""
     if not payload.query:
         raise HTTPException(
             status_code=400,
-            detail="Por ahora 'query' es obligatorio para la búsqueda en Mifarma.",
+            detail=f"Por ahora 'query' es obligatorio para la búsqueda en {label}.",
         )
 
-    try:
-        from mifarma_scraper import scrape_mifarma_live
-    except ImportError:
-        raise HTTPException(status_code=503, detail="Scraper de Mifarma no disponible")
-
-    raw_results = scrape_mifarma_live(
-        query=payload.query,
-        user_location=payload.user_location,
-        filters=payload.filters,
-    )
-
-    norm_query = normalize_text(payload.query)
-    tokens = [t for t in norm_query.split() if len(t) > 2]
-
-    if tokens:
-        filtered_results: List[ProductResult] = []
-        for r in raw_results:
-            full_name = f"{r.name} {r.brand or ''}"
-            norm_name = normalize_text(full_name)
-            if all(tok in norm_name for tok in tokens):
-                filtered_results.append(r)
-        results = filtered_results
-    else:
-        results = raw_results
+    if scraper is None:
+        raise HTTPException(status_code=503, detail=f"Scraper de {label} no disponible")
 
-    message = "OK" if results else "Sin resultados para esta búsqueda en Mifarma"
-    return SearchResponse(results=results, total=len(results), message=message)
-
-
-@app.post("/search/promart-live", response_model=SearchResponse)
-def search_promart_live_endpoint(payload: SearchRequest):
-    """Búsqueda en tiempo real en Promart (API VTEX catalog_system), con filtro ESTRICTO."""
-    if not payload.query:
-        raise HTTPException(
-            status_code=400,
-            detail="Por ahora 'query' es obligatorio para la búsqueda en Promart.",
-        )
-
-    try:
-        from vtex_scraper import scrape_vtex_catalog_live
-    except ImportError:
-        raise HTTPException(status_code=503, detail="Scraper VTEX no disponible")
-
-    raw_results = scrape_vtex_catalog_live(
-        store_name="Promart",
-        store_id=5,
-        base_origin="https://www.promart.pe",
-        store_lat=-12.06,
-        store_lon=-77.04,
+    # 1) Scraping crudo (trae todo lo que devuelve la tienda para ese q)
+    raw_results = scraper(
         query=payload.query,
         user_location=payload.user_location,
         filters=payload.filters,
+        **store_kwargs,
     )
 
-    norm_query = normalize_text(payload.query)
-    tokens = [t for t in norm_query.split() if len(t) > 2]
-
-    if tokens:
-        filtered_results: List[ProductResult] = []
-        for r in raw_results:
-            full_name = f"{r.name} {r.brand or ''}"
-            norm_name = normalize_text(full_name)
-            if all(tok in norm_name for tok in tokens):
-                filtered_results.append(r)
-        results = filtered_results
-    else:
-        results = raw_results
+    # 2) Filtro estricto: TODAS las palabras deben aparecer en (nombre + marca)
+    results = strict_filter(raw_results, payload.query)
 
-    message = "OK" if results else "Sin resultados para esta búsqueda en Promart"
-    return SearchResponse(results=results, total=len(results), message=message)
-
-
-@app.post("/search/oechsle-live", response_model=SearchResponse)
-def search_oechsle_live_endpoint(payload: SearchRequest):
-    """Búsqueda en tiempo real en Oechsle (API VTEX catalog_system), con filtro ESTRICTO."""
-    if not payload.query:
-        raise HTTPException(
-            status_code=400,
-            detail="Por ahora 'query' es obligatorio para la búsqueda en Oechsle.",
-        )
+    message = "OK" if results else f"Sin resultados para esta búsqueda en {label}"
 
-    try:
-        from vtex_scraper import scrape_vtex_catalog_live
-    except ImportError:
-        raise HTTPException(status_code=503, detail="Scraper VTEX no disponible")
-
-    raw_results = scrape_vtex_catalog_live(
-        store_name="Oechsle",
-        store_id=6,
-        base_origin="https://www.oechsle.pe",
-        store_lat=-12.06,
-        store_lon=-77.04,
-        query=payload.query,
-        user_location=payload.user_location,
-        filters=payload.filters,
-    )
-
-    norm_query = normalize_text(payload.query)
-    tokens = [t for t in norm_query.split() if len(t) > 2]
-
-    if tokens:
-        filtered_results: List[ProductResult] = []
-        for r in raw_results:
-            full_name = f"{r.name} {r.brand or ''}"
-            norm_name = normalize_text(full_name)
-            if all(tok in norm_name for tok in tokens):
-                filtered_results.append(r)
-        results = filtered_results
-    else:
-        results = raw_results
-
-    message = "OK" if results else "Sin resultados para esta búsqueda en Oechsle"
     return SearchResponse(results=results, total=len(results), message=message)
 
 
-@app.post("/search/plazavea-live", response_model=SearchResponse)
-def search_plazavea_live_endpoint(payload: SearchRequest):
-    """Búsqueda en tiempo real en PlazaVea (API VTEX catalog_system), con filtro ESTRICTO."""
-    if not payload.query:
-        raise HTTPException(
-            status_code=400,
-            detail="Por ahora 'query' es obligatorio para la búsqueda en PlazaVea.",
-        )
-
-    try:
-        from vtex_scraper import scrape_vtex_catalog_live
-    except ImportError:
-        raise HTTPException(status_code=503, detail="Scraper VTEX no disponible")
-
-    raw_results = scrape_vtex_catalog_live(
-        store_name="PlazaVea",
-        store_id=7,
-        base_origin="https://www.plazavea.com.pe",
-        store_lat=-12.06,
-        store_lon=-77.04,
-        query=payload.query,
-        user_location=payload.user_location,
-        filters=payload.filters,
-    )
-
-    norm_query = normalize_text(payload.query)
-    tokens = [t for t in norm_query.split() if len(t) > 2]
-
-    if tokens:
-        filtered_results: List[ProductResult] = []
-        for r in raw_results:
-            full_name = f"{r.name} {r.brand or ''}"
-            norm_name = normalize_text(full_name)
-            if all(tok in norm_name for tok in tokens):
-                filtered_results.append(r)
-        results = filtered_results
-    else:
-        results = raw_results
-
-    message = "OK" if results else "Sin resultados para esta búsqueda en PlazaVea"
-    return SearchResponse(results=results, total=len(results), message=message)
+# Máximo de productos únicos que devuelve /search/all-stores
+ALL_STORES_MAX_RESULTS = 50
 
 
 @app.post("/search/all-stores", response_model=SearchResponse)
@@ -1308,102 +1485,47 @@ def search_all_stores(payload: SearchRequest):
     # 1) Corregir query automáticamente
     corrected_query = correct_search_query(payload.query)
     
-    # 2) Buscar en todas las tiendas
-
-    try:
-        from vtex_scraper import scrape_vtex_catalog_live
-    except ImportError:
-        print("Advertencia: VTEX scraper no disponible")
-        promart_results = []
-        oechsle_results = []
-        plazavea_results = []
-    else:
-        promart_results = scrape_vtex_catalog_live(
-            store_name="Promart",
-            store_id=5,
-            base_origin="https://www.promart.pe",
-            store_lat=-12.06,
-            store_lon=-77.04,
-            query=corrected_query,
-            user_location=payload.user_location,
-            filters=payload.filters,
-        )
-        oechsle_results = scrape_vtex_catalog_live(
-            store_name="Oechsle",
-            store_id=6,
-            base_origin="https://www.oechsle.pe",
-            store_lat=-12.06,
-            store_lon=-77.04,
-            query=corrected_query,
-            user_location=payload.user_location,
-            filters=payload.filters,
-        )
-        plazavea_results = scrape_vtex_catalog_live(
-            store_name="PlazaVea",
-            store_id=7,
-            base_origin="https://www.plazavea.com.pe",
-            store_lat=-12.06,
-            store_lon=-77.04,
-            query=corrected_query,
-            user_location=payload.user_location,
-            filters=payload.filters,
-        )
-
-    # Hiraoka y Falabella siempre disponibles
-    hiraoka_results = scrape_hiraoka_live(
-        query=corrected_query,
-        user_location=payload.user_location,
-        filters=payload.filters,
-    )
-    
-    falabella_results = scrape_falabella_live(
-        query=corrected_query,
-        user_location=payload.user_location,
-        filters=payload.filters,
-    )
-
-    # Inkafarma
-    try:
-        from inkafarma_scraper import scrape_inkafarma_live
-    except ImportError:
-        print("Advertencia: Inkafarma scraper no disponible")
-        inkafarma_results = []
-    else:
-        inkafarma_results = scrape_inkafarma_live(
-            query=corrected_query,
-            user_location=payload.user_location,
-            filters=payload.filters,
-        )
-
-    # 3) Combinar resultados
-    all_results = (
-        hiraoka_results
-        + falabella_results
-        + promart_results
-        + oechsle_results
-        + plazavea_results
-        + inkafarma_results
+    # 2-3) Buscar en todas las tiendas (en paralelo) y combinar resultados
+    all_results = scrape_all_stores(
+        corrected_query,
+        payload.user_location,
+        payload.filters,
+        include_inkafarma=True,
     )
 
     # 4) Aplicar filtrado inteligente
     if all_results:
         all_results = smart_search_filter(all_results, corrected_query)
 
-    # 5) Ordenar por precio si no hay ubicación del usuario
+    # 5-6) Eliminar duplicados (por nombre + marca similar), hasta 50 resultados.
+    # normalize_text está cacheada: los nombres ya vistos en el filtrado no se
+    # vuelven a normalizar
     if not payload.user_location:
-        all_results.sort(key=lambda r: (r.price, r.store_name))
-
-    # 6) Eliminar duplicados (por nombre + marca similar)
-    seen = set()
-    unique_results = []
-    for r in all_results:
-        key = normalize_text(f"{r.name} {r.brand or ''}")
-        if key not in seen:
+        # Sin ubicación: por cada producto se queda el más barato y luego un
+        # top-K por precio (O(N log K)) en vez de ordenar la lista completa
+        # (precio, tienda, posición): la posición desempata igual que un sort estable
+        cheapest: Dict[str, tuple] = {}
+        for idx, r in enumerate(all_results):
+            key = normalize_text(f"{r.name} {r.brand}" if r.brand else r.name)
+            rank = (r.price, r.store_name, idx)
+            current = cheapest.get(key)
+            if current is None or rank < current[0]:
+                cheapest[key] = (rank, r)
+        unique_results = [
+            r for _, r in heapq.nsmallest(ALL_STORES_MAX_RESULTS, cheapest.values())
+        ]
+    else:
+        # Con ubicación se respeta el orden que ya traen los resultados
+        seen = set()
+        unique_results = []
+        for r in all_results:
+            key = normalize_text(f"{r.name} {r.brand}" if r.brand else r.name)
+            if key in seen:
+                continue
             seen.add(key)
             unique_results.append(r)
-
-    # Limitar a 50 resultados
-    unique_results = unique_results[:50]
+            if len(unique_results) == ALL_STORES_MAX_RESULTS:
+                break
 
     message = f"Búsqueda en {len(set(r.store_name for r in unique_results))} tiendas: {len(unique_results)} productos encontrados"
     if corrected_query != payload.query:
@@ -1421,59 +1543,9 @@ def get_recommendations(payload: SearchRequest):
     if not payload.query:
         raise HTTPException(status_code=400, detail="'query' es obligatorio")
 
-    # Buscar en todas las tiendas
+    # Buscar en todas las tiendas (en paralelo)
     corrected_query = correct_search_query(payload.query)
-    
-
-    try:
-        from vtex_scraper import scrape_vtex_catalog_live
-    except ImportError:
-        promart_results = []
-        oechsle_results = []
-        plazavea_results = []
-    else:
-        promart_results = scrape_vtex_catalog_live(
-            store_name="Promart",
-            store_id=5,
-            base_origin="https://www.promart.pe",
-            store_lat=-12.06,
-            store_lon=-77.04,
-            query=corrected_query,
-            user_location=payload.user_location,
-            filters=payload.filters,
-        )
-        oechsle_results = scrape_vtex_catalog_live(
-            store_name="Oechsle",
-            store_id=6,
-            base_origin="https://www.oechsle.pe",
-            store_lat=-12.06,
-            store_lon=-77.04,
-            query=corrected_query,
-            user_location=payload.user_location,
-            filters=payload.filters,
-        )
-        plazavea_results = scrape_vtex_catalog_live(
-            store_name="PlazaVea",
-            store_id=7,
-            base_origin="https://www.plazavea.com.pe",
-            store_lat=-12.06,
-            store_lon=-77.04,
-            query=corrected_query,
-            user_location=payload.user_location,
-            filters=payload.filters,
-        )
-
-    hiraoka_results = scrape_hiraoka_live(corrected_query, payload.user_location, payload.filters)
-    falabella_results = scrape_falabella_live(corrected_query, payload.user_location, payload.filters)
-    
-    all_results = (
-        hiraoka_results
-        + falabella_results
-        
-        + promart_results
-        + oechsle_results
-        + plazavea_results
-    )
+    all_results = scrape_all_stores(corrected_query, payload.user_location, payload.filters)
 
     # Generar recomendaciones
     recommendations = generate_recommendations(all_results, corrected_query)
@@ -1498,82 +1570,27 @@ def compare_prices(payload: SearchRequest):
 
     corrected_query = correct_search_query(payload.query)
     
-    # Obtener productos de todas las tiendas
-    
-
-    try:
-        from vtex_scraper import scrape_vtex_catalog_live
-    except ImportError:
-        promart_results = []
-        oechsle_results = []
-        plazavea_results = []
-    else:
-        promart_results = scrape_vtex_catalog_live(
-            store_name="Promart",
-            store_id=5,
-            base_origin="https://www.promart.pe",
-            store_lat=-12.06,
-            store_lon=-77.04,
-            query=corrected_query,
-            user_location=payload.user_location,
-            filters=payload.filters,
-        )
-        oechsle_results = scrape_vtex_catalog_live(
-            store_name="Oechsle",
-            store_id=6,
-            base_origin="https://www.oechsle.pe",
-            store_lat=-12.06,
-            store_lon=-77.04,
-            query=corrected_query,
-            user_location=payload.user_location,
-            filters=payload.filters,
-        )
-        plazavea_results = scrape_vtex_catalog_live(
-            store_name="PlazaVea",
-            store_id=7,
-            base_origin="https://www.plazavea.com.pe",
-            store_lat=-12.06,
-            store_lon=-77.04,
-            query=corrected_query,
-            user_location=payload.user_location,
-            filters=payload.filters,
-        )
-
-    hiraoka_results = scrape_hiraoka_live(corrected_query, payload.user_location, payload.filters)
-    falabella_results = scrape_falabella_live(corrected_query, payload.user_location, payload.filters)
-    
-    all_results = (
-        hiraoka_results
-        + falabella_results
-        
-        + promart_results
-        + oechsle_results
-        + plazavea_results
-    )
+    # Obtener productos de todas las tiendas (en paralelo)
+    all_results = scrape_all_stores(corrected_query, payload.user_location, payload.filters)
 
     # Generar comparativas
     comparisons = []
     
     # Agrupar por nombre normalizado
-    products_by_name = {}
-    for product in all_results:
-        norm_name = normalize_text(product.name)
-        if norm_name not in products_by_name:
-            products_by_name[norm_name] = []
-        products_by_name[norm_name].append(product)
+    products_by_name = group_by_normalized_name(all_results)
     
-    # Crear comparativas
+    # Crear comparativas (solo productos presentes en más de una tienda)
     for product_name, products in products_by_name.items():
         if len(products) > 1:
             comparison = get_price_comparison(products, product_name)
             if comparison:
                 comparisons.append(comparison)
     
-    # Ordenar por ahorro potencial
-    comparisons.sort(key=lambda c: c.savings_percentage, reverse=True)
+    # Top 10 por ahorro potencial (heap O(N log 10), mismo orden que un sort estable)
+    top_comparisons = heapq.nlargest(10, comparisons, key=attrgetter("savings_percentage"))
     
     return {
-        "comparisons": comparisons[:10],
+        "comparisons": top_comparisons,
         "total": len(comparisons),
         "message": f"Se encontraron {len(comparisons)} productos en múltiples tiendas"
     }
@@ -1589,79 +1606,24 @@ def get_statistics(payload: SearchRequest):
 
     corrected_query = correct_search_query(payload.query)
     
-    # Obtener productos
-    
-
-    try:
-        from vtex_scraper import scrape_vtex_catalog_live
-    except ImportError:
-        promart_results = []
-        oechsle_results = []
-        plazavea_results = []
-    else:
-        promart_results = scrape_vtex_catalog_live(
-            store_name="Promart",
-            store_id=5,
-            base_origin="https://www.promart.pe",
-            store_lat=-12.06,
-            store_lon=-77.04,
-            query=corrected_query,
-            user_location=payload.user_location,
-            filters=payload.filters,
-        )
-        oechsle_results = scrape_vtex_catalog_live(
-            store_name="Oechsle",
-            store_id=6,
-            base_origin="https://www.oechsle.pe",
-            store_lat=-12.06,
-            store_lon=-77.04,
-            query=corrected_query,
-            user_location=payload.user_location,
-            filters=payload.filters,
-        )
-        plazavea_results = scrape_vtex_catalog_live(
-            store_name="PlazaVea",
-            store_id=7,
-            base_origin="https://www.plazavea.com.pe",
-            store_lat=-12.06,
-            store_lon=-77.04,
-            query=corrected_query,
-            user_location=payload.user_location,
-            filters=payload.filters,
-        )
-
-    hiraoka_results = scrape_hiraoka_live(corrected_query, payload.user_location, payload.filters)
-    falabella_results = scrape_falabella_live(corrected_query, payload.user_location, payload.filters)
-    
-    all_results = (
-        hiraoka_results
-        + falabella_results
-        
-        + promart_results
-        + oechsle_results
-        + plazavea_results
-    )
+    # Obtener productos (en paralelo)
+    all_results = scrape_all_stores(corrected_query, payload.user_location, payload.filters)
 
     # Generar estadísticas
     statistics = []
     
-    products_by_name = {}
-    for product in all_results:
-        norm_name = normalize_text(product.name)
-        if norm_name not in products_by_name:
-            products_by_name[norm_name] = []
-        products_by_name[norm_name].append(product)
+    products_by_name = group_by_normalized_name(all_results)
     
     for product_name, products in products_by_name.items():
         stats = get_price_statistics(products, product_name)
         if stats:
             statistics.append(stats)
     
-    # Ordenar por cantidad de tiendas
-    statistics.sort(key=lambda s: s.count, reverse=True)
+    # Top 10 por cantidad de tiendas
+    top_statistics = heapq.nlargest(10, statistics, key=attrgetter("count"))
     
     return {
-        "statistics": statistics[:10],
+        "statistics": top_statistics,
         "total": len(statistics),
         "message": f"Estadísticas de {len(statistics)} productos encontrados"
     }
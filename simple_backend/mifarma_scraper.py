@@ -2,13 +2,14 @@
 Scraper para Mifarma (Perú) usando API de Algolia.
 Mifarma es parte del grupo Intercorp (mismo grupo que Inkafarma).
 """
-import json
 from decimal import Decimal
+from functools import lru_cache
 from typing import List, Optional
 
-import requests
+import httpx
+import orjson
 
-from main import normalize_text, haversine_km, Location, ProductResult, SearchFilters
+from main import normalize_text, tokenize_query, haversine_km, Location, ProductResult, SearchFilters
 
 # API de Algolia para Mifarma
 ALGOLIA_APP_ID = "O74E6QKJ1F"
@@ -20,6 +21,32 @@ MIFARMA_LAT = -12.06
 MIFARMA_LON = -77.04
 IMAGE_BASE_URL = "https://dcuk1cxrnzjkh.cloudfront.net/imagesproducto/"
 
+# Invariantes de cada resultado: se crean una vez al importar el módulo
+MIFARMA_LOCATION = Location(lat=MIFARMA_LAT, lon=MIFARMA_LON)
+MIFARMA_PAYMENT_METHODS = ("tarjeta", "efectivo", "online")
+
+# Cliente HTTP/2 compartido: Algolia acepta HTTP/2, así que las búsquedas
+# reutilizan (y multiplexan) una sola conexión TLS
+CLIENT = httpx.Client(
+    headers={
+        "Content-Type": "application/json",
+        "X-Algolia-Application-Id": ALGOLIA_APP_ID,
+        "X-Algolia-API-Key": ALGOLIA_API_KEY,
+    },
+    timeout=20.0,
+    transport=httpx.HTTPTransport(
+        http2=True,
+        retries=2,
+        limits=httpx.Limits(max_keepalive_connections=5),
+    ),
+)
+
+
+@lru_cache(maxsize=1024)
+def _query_body(query: str) -> bytes:
+    """Cuerpo JSON de la búsqueda en Algolia, ya serializado (las queries se repiten)."""
+    return orjson.dumps({"query": query, "hitsPerPage": 50})
+
 
 def scrape_mifarma_live(
     query: str,
@@ -29,21 +56,10 @@ def scrape_mifarma_live(
     """
     Scraper en vivo para Mifarma (Perú) usando API de Algolia.
     """
-    headers = {
-        "Content-Type": "application/json",
-        "X-Algolia-Application-Id": ALGOLIA_APP_ID,
-        "X-Algolia-API-Key": ALGOLIA_API_KEY,
-    }
-
-    body = {
-        "query": query,
-        "hitsPerPage": 50,
-    }
-
     try:
-        resp = requests.post(ALGOLIA_URL, json=body, headers=headers, timeout=20)
+        resp = CLIENT.post(ALGOLIA_URL, content=_query_body(query))
         resp.raise_for_status()
-        data = resp.json()
+        data = orjson.loads(resp.content)
     except Exception as e:
         print(f"Error al conectar con Mifarma (Algolia): {e}")
         return []
@@ -52,6 +68,17 @@ def scrape_mifarma_live(
 
     results: List[ProductResult] = []
 
+    # Palabras de la query: se calculan una vez, no por cada hit
+    query_tokens = tuple(t for t in tokenize_query(query) if len(t) > 2)
+
+    # Distancia al usuario: la tienda tiene coordenadas fijas, se calcula una vez
+    distance_km = None
+    if user_location and user_location.lat and user_location.lon:
+        distance_km = round(
+            haversine_km(user_location.lat, user_location.lon, MIFARMA_LAT, MIFARMA_LON),
+            3,
+        )
+
     for idx, hit in enumerate(hits, start=1):
         try:
             # ========= NOMBRE =========
@@ -67,16 +94,6 @@ def scrape_mifarma_live(
             # ========= MARCA =========
             brand = hit.get("brand", None)
 
-            # ========= FILTRO POR PALABRAS (menos estricto, Algolia ya filtra bien) =====
-            full_name = f"{name} {brand or ''}"
-            norm_full_name = normalize_text(full_name)
-
-            query_tokens = [t for t in normalize_text(query).split() if len(t) > 2]
-
-            # Verificar que cada token esté contenido en el nombre (no como palabra exacta)
-            if query_tokens and not all(tok in norm_full_name for tok in query_tokens):
-                continue
-
             # ========= PRECIO =========
             # Usar precio con promoción si existe, sino precio normal
             price_promo = hit.get("pricePromo", 0)
@@ -88,6 +105,23 @@ def scrape_mifarma_live(
 
             price = float(price)
 
+            # ========= FILTROS SIMPLES =========
+            # Antes de normalizar el nombre: los descartes por precio/marca son baratos
+            if filters:
+                if filters.max_price is not None and price > filters.max_price:
+                    continue
+                if filters.brand:
+                    if not brand or filters.brand.lower() not in brand.lower():
+                        continue
+
+            # ========= FILTRO POR PALABRAS (menos estricto, Algolia ya filtra bien) =====
+            full_name = f"{name} {brand}" if brand else name
+            norm_full_name = normalize_text(full_name)
+
+            # Verificar que cada token esté contenido en el nombre (no como palabra exacta)
+            if query_tokens and not all(tok in norm_full_name for tok in query_tokens):
+                continue
+
             # ========= IMAGEN =========
             image_url = hit.get("image", None)
             if not image_url:
@@ -99,51 +133,31 @@ def scrape_mifarma_live(
             uri = hit.get("uri", "")
             product_url = f"https://www.mifarma.com.pe/producto/{uri}" if uri else None
 
-            # ========= FILTROS SIMPLES =========
-            if filters:
-                if filters.max_price is not None and price > filters.max_price:
-                    continue
-                if filters.min_price is not None and price < filters.min_price:
-                    continue
-
-            # ========= DISTANCIA =========
-            distance_km = None
-            if user_location and user_location.lat and user_location.lon:
-                distance_km = haversine_km(
-                    user_location.lat, user_location.lon,
-                    MIFARMA_LAT, MIFARMA_LON
+            # ========= CATEGORÍA =========
+            # Algolia la envía como lista; si viene como texto se usa tal cual
+            category = hit.get("category")
+            if isinstance(category, list):
+                category = category[0] if category else None
+
+            # Campos crudos de Algolia: ProductResult los valida y un hit malformado
+            # cae en el except de abajo en vez de llegar a la respuesta
+            results.append(
+                ProductResult(
+                    product_id=idx,
+                    name=name.strip(),
+                    brand=brand,
+                    category=category,
+                    image_url=image_url,
+                    product_url=product_url,
+                    price=price,
+                    currency="PEN",
+                    store_id=11,
+                    store_name="Mifarma Online",
+                    store_location=MIFARMA_LOCATION,
+                    distance_km=distance_km,
+                    payment_methods=list(MIFARMA_PAYMENT_METHODS),
                 )
-
-            # ========= INFORMACIÓN ADICIONAL =========
-            category = hit.get("category", [])
-            category_str = category[0] if category else None
-            
-            sub_category = hit.get("subCategory", [])
-            sub_category_str = sub_category[0] if sub_category else None
-
-            # ========= CREAR RESULTADO =========
-            results.append(ProductResult(
-                product_id=str(hit.get("objectID", f"mifarma_{idx}")),
-                name=name.strip(),
-                brand=brand,
-                price=price,
-                currency="PEN",
-                image_url=image_url,
-                product_url=product_url,
-                store_name="Mifarma",
-                store_code="mifarma",
-                store_address="Lima, Perú",
-                store_lat=MIFARMA_LAT,
-                store_lon=MIFARMA_LON,
-                distance_km=distance_km,
-                category=category_str,
-                subcategory=sub_category_str,
-                availability="in_stock" if hit.get("validPrice", True) else "unknown",
-                rating=None,
-                reviews_count=None,
-                discount_percent=hit.get("discountRate", None),
-                original_price=price_list if price_promo and price_promo > 0 else None,
-            ))
+            )
 
         except Exception as e:
             print(f"Error procesando producto Mifarma: {e}")
@@ -0,0 +1,143 @@
+"""
+Migraciones de esquema para bases de datos ya existentes.
+
+`Base.metadata.create_all` solo crea tablas nuevas: nunca agrega índices a
+tablas que ya existen. Este módulo aplica esos cambios de forma idempotente
+(SQLite y Postgres), así que se puede ejecutar en cada arranque.
+
+El índice único de inventario no se crea si hay filas duplicadas (tienda,
+producto): se reportan y hay que limpiarlas a mano, una sola vez, con
+`python migrations.py --dedupe-inventory`. El arranque nunca borra datos.
+"""
+import argparse
+import logging
+from collections import defaultdict
+from typing import List, Tuple
+
+from sqlalchemy import bindparam, inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+logger = logging.getLogger("simple_backend.migrations")
+
+INVENTORY_UNIQUE_INDEX = "ix_inv_store_product"
+
+# Pares (tienda, producto) repetidos: impiden crear el índice único
+DUPLICATE_INVENTORY_SQL = """
+SELECT store_id, product_id, COUNT(*) AS n
+FROM inventory_items
+GROUP BY store_id, product_id
+HAVING COUNT(*) > 1
+"""
+
+DUPLICATE_INVENTORY_ROWS_SQL = """
+SELECT i.id, i.store_id, i.product_id, i.last_updated
+FROM inventory_items i
+JOIN (
+    SELECT store_id, product_id
+    FROM inventory_items
+    GROUP BY store_id, product_id
+    HAVING COUNT(*) > 1
+) d ON i.store_id = d.store_id AND i.product_id = d.product_id
+"""
+
+# Índices sin riesgo: no dependen de los datos
+INDEX_DDL = (
+    "CREATE INDEX IF NOT EXISTS ix_product_name_brand ON products (name, brand)",
+    "CREATE INDEX IF NOT EXISTS ix_inv_product_price ON inventory_items (product_id, price)",
+    # Cubierto por ix_inv_product_price (product_id lo encabeza)
+    "DROP INDEX IF EXISTS ix_inventory_items_product_id",
+)
+
+# Solo cuando no hay duplicados
+UNIQUE_INDEX_DDL = (
+    f"CREATE UNIQUE INDEX IF NOT EXISTS {INVENTORY_UNIQUE_INDEX} "
+    "ON inventory_items (store_id, product_id)",
+    # Cubierto por ix_inv_store_product (store_id lo encabeza)
+    "DROP INDEX IF EXISTS ix_inventory_items_store_id",
+)
+
+
+class DuplicateInventoryError(RuntimeError):
+    """Hay filas duplicadas (tienda, producto): el índice único no se puede crear."""
+
+    def __init__(self, duplicates: List[Tuple[int, int, int]]):
+        self.duplicates = duplicates
+        sample = ", ".join(f"(tienda {s}, producto {p}): {n}" for s, p, n in duplicates[:10])
+        super().__init__(
+            f"{len(duplicates)} pares (tienda, producto) duplicados en inventory_items "
+            f"[{sample}{', ...' if len(duplicates) > 10 else ''}]. "
+            f"No se creó {INVENTORY_UNIQUE_INDEX}; revisar y ejecutar "
+            "`python migrations.py --dedupe-inventory`."
+        )
+
+
+def _has_index(conn: Connection, table: str, name: str) -> bool:
+    return any(ix["name"] == name for ix in inspect(conn).get_indexes(table))
+
+
+def upgrade_schema(engine: Engine) -> None:
+    """
+    Aplica los índices de los modelos a una base creada con versiones anteriores.
+    Lanza DuplicateInventoryError (sin borrar nada) si el inventario tiene
+    duplicados; el resto de índices queda aplicado igual.
+    """
+    with engine.begin() as conn:
+        for ddl in INDEX_DDL:
+            conn.execute(text(ddl))
+
+        # Con el índice único ya creado no puede haber duplicados: nada que revisar
+        if _has_index(conn, "inventory_items", INVENTORY_UNIQUE_INDEX):
+            return
+
+        duplicates = [tuple(row) for row in conn.execute(text(DUPLICATE_INVENTORY_SQL))]
+        if not duplicates:
+            for ddl in UNIQUE_INDEX_DDL:
+                conn.execute(text(ddl))
+            return
+
+    raise DuplicateInventoryError(duplicates)
+
+
+def dedupe_inventory(engine: Engine) -> int:
+    """
+    Migración manual (una sola vez): deja una fila por (tienda, producto), la
+    de `last_updated` más reciente (a igual fecha, la de mayor id).
+    Devuelve cuántas filas se borraron.
+    """
+    with engine.begin() as conn:
+        groups = defaultdict(list)
+        for row in conn.execute(text(DUPLICATE_INVENTORY_ROWS_SQL)):
+            groups[(row.store_id, row.product_id)].append(row)
+
+        to_delete = []
+        for rows in groups.values():
+            # Filas sin fecha cuentan como las más antiguas
+            keep = max(rows, key=lambda r: (r.last_updated is not None, r.last_updated or "", r.id))
+            to_delete.extend(r.id for r in rows if r.id != keep.id)
+
+        if to_delete:
+            conn.execute(
+                text("DELETE FROM inventory_items WHERE id IN :ids").bindparams(
+                    bindparam("ids", expanding=True)
+                ),
+                {"ids": to_delete},
+            )
+    return len(to_delete)
+
+
+if __name__ == "__main__":
+    from db import engine as default_engine
+
+    parser = argparse.ArgumentParser(description="Migraciones de esquema de simple_backend")
+    parser.add_argument(
+        "--dedupe-inventory",
+        action="store_true",
+        help="borra filas duplicadas (tienda, producto), conservando la más reciente",
+    )
+    args = parser.parse_args()
+
+    if args.dedupe_inventory:
+        deleted = dedupe_inventory(default_engine)
+        print(f"✓ Inventario: {deleted} filas duplicadas eliminadas")
+    upgrade_schema(default_engine)
+    print("✓ Esquema actualizado")
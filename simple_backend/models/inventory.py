@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, ForeignKey, Numeric, String, DateTime
+from sqlalchemy import Column, Integer, ForeignKey, Index, Numeric, String, DateTime
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
@@ -8,8 +8,9 @@ class InventoryItem(Base):
     __tablename__ = "inventory_items"
 
     id = Column(Integer, primary_key=True, index=True)
-    store_id = Column(Integer, ForeignKey("stores.id"), nullable=False, index=True)
-    product_id = Column(Integer, ForeignKey("products.id"), nullable=False, index=True)
+    # Sin index=True: ambos quedan cubiertos por los índices compuestos de abajo
+    store_id = Column(Integer, ForeignKey("stores.id"), nullable=False)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
     price = Column(Numeric(10, 2), nullable=False)
     currency = Column(String(10), nullable=False, default="PEN")
     stock = Column(Integer, nullable=True)
@@ -17,3 +18,10 @@ class InventoryItem(Base):
 
     store = relationship("Store", backref="inventory_items")
     product = relationship("Product", backref="inventory_items")
+
+    __table_args__ = (
+        # Un solo precio por (tienda, producto); también acelera el upsert
+        Index("ix_inv_store_product", "store_id", "product_id", unique=True),
+        # Precios de un producto en todas las tiendas, ya ordenados por precio
+        Index("ix_inv_product_price", "product_id", "price"),
+    )
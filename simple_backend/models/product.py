@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text
+from sqlalchemy import Column, Index, Integer, String, Text
 from db import Base
 
 class Product(Base):
@@ -10,3 +10,8 @@ class Product(Base):
     category = Column(String(100), nullable=True, index=True)
     description = Column(Text, nullable=True)
     image_url = Column(String(500), nullable=True)
+
+    __table_args__ = (
+        # Búsqueda de producto por nombre + marca al hacer upsert del scraping
+        Index("ix_product_name_brand", "name", "brand"),
+    )
@@ -0,0 +1,26 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# La BD se configura al importar `db`: usar un SQLite temporal antes de eso
+_TMP_DIR = tempfile.mkdtemp(prefix="simple_backend_tests_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_TMP_DIR, 'test.db')}"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import Base, SessionLocal, engine  # noqa: E402
+import models  # noqa: E402,F401
+
+
+@pytest.fixture
+def db():
+    """Sesión sobre un esquema recién creado."""
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
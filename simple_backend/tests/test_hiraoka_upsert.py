@@ -0,0 +1,52 @@
+from sqlalchemy import text
+
+import hiraoka_scraper
+from db import engine
+from hiraoka_scraper import upsert_products_and_inventory
+from models import InventoryItem, Product, Store
+
+
+def _store(db):
+    store = Store(name="Hiraoka Online", code="hiraoka-online", latitude=-12.06, longitude=-77.04)
+    db.add(store)
+    db.commit()
+    return store
+
+
+def _item(name, price):
+    return {"name": name, "brand": "LG", "category": "tv", "price": price, "image_url": None}
+
+
+def _inventory(db):
+    db.expire_all()
+    return sorted(
+        (inv.product_id, float(inv.price)) for inv in db.query(InventoryItem).all()
+    )
+
+
+def test_upsert_twice_updates_instead_of_duplicating(db):
+    store = _store(db)
+
+    upsert_products_and_inventory(db, store, [_item("Televisor LG 55", 1299.9)])
+    upsert_products_and_inventory(
+        db, store, [_item("Televisor LG 55", 999.5), _item("Televisor LG 65", 2499.0)]
+    )
+
+    products = {p.name: p.id for p in db.query(Product).all()}
+    assert _inventory(db) == [
+        (products["Televisor LG 55"], 999.5),
+        (products["Televisor LG 65"], 2499.0),
+    ]
+
+
+def test_upsert_without_unique_index_falls_back_to_orm(db):
+    # BD anterior a ix_inv_store_product y todavía sin migrar
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_inv_store_product"))
+    hiraoka_scraper._UPSERT_READY.clear()
+    store = _store(db)
+
+    upsert_products_and_inventory(db, store, [_item("Televisor LG 55", 1299.9)])
+    upsert_products_and_inventory(db, store, [_item("Televisor LG 55", 999.5)])
+
+    assert [price for _, price in _inventory(db)] == [999.5]
@@ -0,0 +1,32 @@
+import orjson
+
+import main  # noqa: F401  (main primero: inkafarma_scraper importa sus utilidades)
+import inkafarma_scraper
+from inkafarma_scraper import scrape_inkafarma_live
+
+HITS = [
+    {"name": "Paracetamol 500mg", "brand": "Genfar", "priceList": 12.5, "category": ["Farmacia"]},
+    {"name": "Paracetamol Forte", "brand": "Portugal", "priceList": 10, "category": "Dolor"},
+    # Malformados: imagen como objeto y precio no numérico
+    {"name": "Paracetamol Gotas", "brand": "Genfar", "priceList": 15, "image": {"url": "x"}},
+    {"name": "Paracetamol Jarabe", "brand": "Genfar", "priceList": "consultar"},
+]
+
+
+class _Response:
+    content = orjson.dumps({"hits": HITS})
+
+    def raise_for_status(self):
+        pass
+
+
+def test_inkafarma_drops_malformed_hits(monkeypatch):
+    monkeypatch.setattr(inkafarma_scraper.CLIENT, "post", lambda *args, **kwargs: _Response())
+    main._SCRAPE_CACHE.clear()
+
+    results = scrape_inkafarma_live("paracetamol")
+
+    assert sorted((r.name, r.category) for r in results) == [
+        ("Paracetamol 500mg", "Farmacia"),
+        ("Paracetamol Forte", "Dolor"),
+    ]
@@ -0,0 +1,83 @@
+import orjson
+
+from main import Location, SearchFilters, SearchResponse
+import mifarma_scraper
+from mifarma_scraper import scrape_mifarma_live
+
+HITS = [
+    {"name": "Paracetamol 500mg", "presentation": "Caja 100 un", "brand": "Genfar",
+     "pricePromo": 0, "priceList": 12.5, "objectID": "001", "uri": "paracetamol-500",
+     "category": ["Farmacia"]},
+    {"name": "Paracetamol Forte", "brand": "Portugal", "pricePromo": 8.9, "priceList": 10,
+     "image": "http://img/p.jpg"},
+    {"name": "Ibuprofeno 400mg", "brand": "Genfar", "priceList": 9},
+]
+
+MALFORMED_HITS = [
+    {"name": "Paracetamol Gotas", "brand": "Genfar", "priceList": 15, "image": {"url": "x"}},
+    {"name": "Paracetamol Jarabe", "brand": "Genfar", "priceList": "consultar"},
+    {"name": "Paracetamol Infantil", "brand": "Genfar", "priceList": 7, "category": "Pediatría"},
+]
+
+
+class _Response:
+    content = orjson.dumps({"hits": HITS})
+
+    def raise_for_status(self):
+        pass
+
+
+def _patch_client(monkeypatch, hits=HITS):
+    response = _Response()
+    response.content = orjson.dumps({"hits": hits})
+    monkeypatch.setattr(mifarma_scraper.CLIENT, "post", lambda *args, **kwargs: response)
+
+
+def test_mifarma_builds_valid_results(monkeypatch):
+    _patch_client(monkeypatch)
+
+    results = scrape_mifarma_live("paracetamol", user_location=Location(lat=-12.1, lon=-77.0))
+
+    assert [(r.name, r.price) for r in results] == [
+        ("Paracetamol 500mg - Caja 100 un", 12.5),
+        ("Paracetamol Forte", 8.9),
+    ]
+    assert results[0].category == "Farmacia"
+    # Misma precisión que el resto de scrapers
+    assert results[0].distance_km == round(results[0].distance_km, 3) > 0
+    assert results[0].image_url.endswith("001X.jpg")
+    # Los resultados pasan la validación del modelo de respuesta
+    SearchResponse.model_validate(
+        {"results": [r.model_dump() for r in results], "total": len(results), "message": "OK"}
+    )
+
+
+def test_mifarma_applies_filters(monkeypatch):
+    _patch_client(monkeypatch)
+
+    cheap = scrape_mifarma_live("paracetamol", filters=SearchFilters(max_price=10))
+    genfar = scrape_mifarma_live("paracetamol", filters=SearchFilters(brand="genfar"))
+
+    assert [r.price for r in cheap] == [8.9]
+    assert [r.brand for r in genfar] == ["Genfar"]
+
+
+def test_mifarma_results_do_not_share_payment_methods(monkeypatch):
+    _patch_client(monkeypatch)
+
+    first, second = scrape_mifarma_live("paracetamol")
+
+    assert first.payment_methods == second.payment_methods
+    assert first.payment_methods is not second.payment_methods
+
+
+def test_mifarma_drops_malformed_hits(monkeypatch):
+    _patch_client(monkeypatch, HITS + MALFORMED_HITS)
+
+    results = scrape_mifarma_live("paracetamol")
+
+    assert [(r.name, r.category) for r in results] == [
+        ("Paracetamol 500mg - Caja 100 un", "Farmacia"),
+        ("Paracetamol Forte", None),
+        ("Paracetamol Infantil", "Pediatría"),
+    ]
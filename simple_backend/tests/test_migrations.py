@@ -0,0 +1,90 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import inspect, text
+
+import main
+from db import engine
+from migrations import DuplicateInventoryError, dedupe_inventory, upgrade_schema
+from models import InventoryItem, Store, Product
+
+
+def _index_names(table):
+    return {ix["name"] for ix in inspect(engine).get_indexes(table)}
+
+
+@pytest.fixture
+def legacy_db(db):
+    """BD creada antes de los índices compuestos, con inventario duplicado."""
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_inv_store_product"))
+        conn.execute(text("DROP INDEX ix_product_name_brand"))
+        conn.execute(text("DROP INDEX ix_inv_product_price"))
+        conn.execute(text("CREATE INDEX ix_inventory_items_store_id ON inventory_items (store_id)"))
+        conn.execute(text("CREATE INDEX ix_inventory_items_product_id ON inventory_items (product_id)"))
+
+    store = Store(name="Tienda", code="tienda", latitude=-12.06, longitude=-77.04)
+    product = Product(name="Televisor LG")
+    db.add_all([store, product])
+    db.flush()
+    db.add_all([
+        # La fila más reciente por fecha tiene el id menor
+        InventoryItem(store_id=store.id, product_id=product.id, price=90, currency="PEN",
+                      last_updated=datetime(2025, 3, 1)),
+        InventoryItem(store_id=store.id, product_id=product.id, price=100, currency="PEN",
+                      last_updated=datetime(2025, 1, 1)),
+    ])
+    db.commit()
+    return db
+
+
+def _prices(db):
+    db.expire_all()
+    return sorted(float(inv.price) for inv in db.query(InventoryItem).all())
+
+
+def test_upgrade_schema_refuses_unique_index_with_duplicates(legacy_db):
+    with pytest.raises(DuplicateInventoryError) as exc:
+        upgrade_schema(engine)
+
+    assert "1 pares" in str(exc.value)
+    # No borra nada: el inventario queda intacto
+    assert _prices(legacy_db) == [90.0, 100.0]
+    inventory_indexes = _index_names("inventory_items")
+    assert "ix_inv_store_product" not in inventory_indexes
+    # Sin el índice único se conserva el de store_id; el resto sí se aplica
+    assert {"ix_inventory_items_store_id", "ix_inv_product_price"} <= inventory_indexes
+    assert "ix_inventory_items_product_id" not in inventory_indexes
+    assert "ix_product_name_brand" in _index_names("products")
+
+
+def test_dedupe_then_upgrade_keeps_latest_row_and_swaps_indexes(legacy_db):
+    assert dedupe_inventory(engine) == 1
+    upgrade_schema(engine)
+    # Idempotente: una segunda ejecución no hace nada
+    upgrade_schema(engine)
+
+    assert _prices(legacy_db) == [90.0]
+    inventory_indexes = _index_names("inventory_items")
+    assert {"ix_inv_store_product", "ix_inv_product_price"} <= inventory_indexes
+    assert not {"ix_inventory_items_store_id", "ix_inventory_items_product_id"} & inventory_indexes
+    assert "ix_product_name_brand" in _index_names("products")
+
+
+def test_startup_seeds_stores_even_if_migration_fails(db, monkeypatch, caplog):
+    # Inventario duplicado sin tiendas: la migración falla y el seed debe correr igual
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_inv_store_product"))
+        conn.execute(text("INSERT INTO products (id, name) VALUES (1, 'Televisor LG')"))
+        for price in (90, 100):
+            conn.execute(text(
+                "INSERT INTO inventory_items (store_id, product_id, price, currency) "
+                f"VALUES (1, 1, {price}, 'PEN')"
+            ))
+    monkeypatch.setattr(main, "_SEED_DONE", False)
+
+    main._startup_init_db()
+
+    assert "Migración de esquema incompleta" in caplog.text
+    assert db.query(Store).count() > 0
+    assert _prices(db) == [90.0, 100.0]
@@ -0,0 +1,54 @@
+import logging
+import threading
+import time
+
+import main
+from main import run_scrapers
+
+
+def _fast(**kwargs):
+    return ["rapido"]
+
+
+def _slow(**kwargs):
+    time.sleep(0.5)
+    return ["lento"]
+
+
+def test_slow_store_is_dropped_and_logged_by_name(monkeypatch, caplog):
+    monkeypatch.setattr(main, "SCRAPE_TIMEOUT", 0.2)
+
+    with caplog.at_level(logging.WARNING, logger="simple_backend"):
+        results = run_scrapers([(_slow, {"store_name": "Oechsle"}), (_fast, {})], query="x")
+
+    assert results == ["rapido"]
+    assert "Oechsle sin respuesta" in caplog.text
+
+
+def test_scrapers_run_concurrently_within_the_timeout(monkeypatch):
+    # Una búsqueda con muchas tiendas lentas cabe en el pool: corren a la vez
+    scrapers = [(_slow, {}) for _ in range(12)] + [(_fast, {})]
+    monkeypatch.setattr(main, "SCRAPE_TIMEOUT", 1.0)
+
+    results = run_scrapers(scrapers, query="x")
+
+    assert results == ["lento"] * 12 + ["rapido"]
+
+
+def test_requests_share_one_bounded_pool(monkeypatch):
+    monkeypatch.setattr(main, "SCRAPE_TIMEOUT", 0.05)
+    threads_before = threading.active_count()
+    workers = set()
+
+    def _record(**kwargs):
+        workers.add(threading.current_thread().name)
+        time.sleep(0.5)
+        return []
+
+    # Varias requests seguidas que agotan su timeout: los rezagados terminan en
+    # el pool compartido y no se crean hilos nuevos por request
+    for _ in range(8):
+        run_scrapers([(_record, {}) for _ in range(10)], query="x")
+
+    assert all(name.startswith("scrape") for name in workers)
+    assert threading.active_count() - threads_before <= main.SCRAPE_WORKERS
@@ -0,0 +1,55 @@
+import main
+from main import Location, ProductResult, cached_scrape
+
+
+def _result(price):
+    return ProductResult(
+        product_id=1,
+        name="Funda iPhone",
+        brand=None,
+        category=None,
+        image_url=None,
+        price=price,
+        currency="PEN",
+        store_id=1,
+        store_name="Tienda",
+        store_location=Location(lat=-12.06, lon=-77.04),
+        distance_km=None,
+        payment_methods=["tarjeta"],
+    )
+
+
+def _counting_scraper():
+    calls = []
+
+    @cached_scrape
+    def scrape_fake_live(query, *args, **kwargs):
+        calls.append(query)
+        return [_result(10.0)]
+
+    return scrape_fake_live, calls
+
+
+def setup_function():
+    main._SCRAPE_CACHE.clear()
+
+
+def test_identical_queries_hit_the_cache():
+    scraper, calls = _counting_scraper()
+
+    scraper("funda iphone")
+    scraper("funda iphone")
+    # Misma query tras normalizar (mayúsculas y tildes)
+    scraper("Funda iPhone")
+
+    assert calls == ["funda iphone"]
+
+
+def test_distinct_queries_miss_the_cache():
+    scraper, calls = _counting_scraper()
+
+    scraper("funda iphone")
+    scraper("iphone funda")
+    scraper("funda iphone 15")
+
+    assert calls == ["funda iphone", "iphone funda", "funda iphone 15"]
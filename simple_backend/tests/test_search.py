@@ -0,0 +1,88 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from main import DbSearchRequest, Location, ProductResult, SearchRequest, app, sort_results
+from models import InventoryItem, Product, Store
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def catalog(db):
+    """Tres tiendas (dos en el mismo punto) y precios repetidos entre productos."""
+    stores = [
+        Store(name="Centro", code="centro", latitude=-12.05, longitude=-77.03, payment_methods="tarjeta"),
+        Store(name="Norte", code="norte", latitude=-12.00, longitude=-77.05, payment_methods="efectivo"),
+        Store(name="Norte 2", code="norte-2", latitude=-12.00, longitude=-77.05, payment_methods="tarjeta"),
+    ]
+    products = [Product(name=f"Televisor LG {n}", brand="LG", category="tv") for n in range(4)]
+    db.add_all(stores + products)
+    db.flush()
+    for n, product in enumerate(products):
+        for store in stores:
+            # Precios repetidos: cada producto cuesta lo mismo en las tres tiendas
+            db.add(InventoryItem(store_id=store.id, product_id=product.id, price=100 + 10 * (n % 2)))
+    db.add(Product(name="Licuadora", brand="Oster", category="cocina"))
+    db.commit()
+    return 12
+
+
+def _search(**body):
+    resp = client.post("/search", json={"query": "televisor", **body})
+    assert resp.status_code == 200
+    return resp.json()
+
+
+def _keys(results):
+    return [(r["store_id"], r["product_id"]) for r in results]
+
+
+def test_search_total_counts_all_matches_not_the_page(catalog):
+    page = _search(limit=5, offset=0)
+
+    assert len(page["results"]) == 5
+    assert page["total"] == catalog
+
+
+def test_search_pages_are_disjoint_and_ordered_by_price(catalog):
+    everything = _search(limit=None)
+    pages = [_search(limit=5, offset=offset) for offset in (0, 5, 10)]
+
+    assert everything["total"] == catalog
+    assert sum((_keys(p["results"]) for p in pages), []) == _keys(everything["results"])
+    prices = [r["price"] for r in everything["results"]]
+    assert prices == sorted(prices)
+    assert all(p["total"] == catalog for p in pages)
+
+
+def test_search_offset_past_the_end_still_reports_total(catalog):
+    page = _search(limit=5, offset=50)
+
+    assert page["results"] == []
+    assert page["total"] == catalog
+
+
+def test_pagination_fields_only_apply_to_search(catalog):
+    assert "limit" not in SearchRequest.model_fields
+    assert {"limit", "offset"} <= set(DbSearchRequest.model_fields)
+
+
+def test_location_search_matches_sort_results_with_ties(catalog, db):
+    location = {"lat": -12.01, "lon": -77.05}
+    everything = _search(user_location=location, limit=None)
+    assert everything["total"] == catalog
+
+    # Referencia: el orden anterior (sort_results sobre todas las filas, en orden de id)
+    by_id = [(i.store_id, i.product_id) for i in db.query(InventoryItem).order_by(InventoryItem.id)]
+    results = {(r["store_id"], r["product_id"]): ProductResult(**r) for r in everything["results"]}
+    expected = sort_results([results[k] for k in by_id], Location(**location))
+    assert _keys(everything["results"]) == [(r.store_id, r.product_id) for r in expected]
+
+    # Hay empates en distancia (dos tiendas en el mismo punto) y en precio
+    distances = [r["distance_km"] for r in everything["results"]]
+    assert len(set(distances)) < len(distances)
+
+    for offset in (0, 4, 8, 11):
+        page = _search(user_location=location, limit=4, offset=offset)
+        assert page["total"] == catalog
+        assert _keys(page["results"]) == _keys(everything["results"])[offset:offset + 4]
@@ -0,0 +1,34 @@
+import orjson
+
+import main  # noqa: F401  (main primero: vtex_scraper importa sus utilidades)
+import vtex_scraper
+from vtex_scraper import scrape_vtex_catalog_live
+
+CATALOG = [
+    {"productId": "12", "productName": "Taladro Bosch 500W", "brand": "Bosch", "link": "https://x/p",
+     "items": [{"images": [{"imageUrl": "http://i"}],
+                "sellers": [{"commertialOffer": {"Price": 199.9, "ListPrice": 250}}]}]},
+    {"productId": "14", "productName": "Taladro Bosch 700W", "brand": "Bosch", "link": "https://x/q",
+     "items": [{"sellers": [{"commertialOffer": {"Price": 299.9}}]}]},
+]
+
+
+class _Response:
+    content = orjson.dumps(CATALOG)
+
+    def raise_for_status(self):
+        pass
+
+
+def test_vtex_results_do_not_share_payment_methods(monkeypatch):
+    monkeypatch.setattr(vtex_scraper.SESSION, "get", lambda *args, **kwargs: _Response())
+    vtex_scraper._CATALOG_CACHE.clear()
+
+    first, second = scrape_vtex_catalog_live(
+        store_name="Promart", store_id=5, base_origin="https://www.promart.pe",
+        store_lat=-12.06, store_lon=-77.04, query="taladro bosch",
+    )
+    first.payment_methods.append("yape")
+
+    assert second.payment_methods == ["tarjeta", "efectivo"]
+    assert list(vtex_scraper.DEFAULT_PAYMENT_METHODS) == ["tarjeta", "efectivo"]
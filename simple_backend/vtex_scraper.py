@@ -1,10 +1,15 @@
-import time
-from typing import Any, Dict, List, Optional
+import threading
+from typing import Dict, List, Optional
 
+from cachetools import TTLCache
+
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
 from urllib.parse import urljoin
+from urllib3.util.retry import Retry
 
-from main import haversine_km, Location, normalize_text, ProductResult, SearchFilters
+from main import haversine_km, Location, normalize_text, tokenize_query, ProductResult, SearchFilters, sort_results
 
 DEFAULT_UA = (
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
@@ -12,24 +17,73 @@ DEFAULT_UA = (
     "Chrome/120.0 Safari/537.36"
 )
 
+# Sesión compartida por las tiendas VTEX (Promart, Oechsle, PlazaVea): reutiliza
+# conexiones TCP/TLS entre búsquedas; un pool por origen. Accept-Encoding queda
+# con el valor por defecto de requests, que ya anuncia br si brotli está instalado
+SESSION = requests.Session()
+SESSION.headers.update({
+    "User-Agent": DEFAULT_UA,
+    "Accept": "application/json",
+    "Accept-Language": "es-PE,es;q=0.9",
+})
+SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=10,
+        pool_maxsize=20,
+        max_retries=Retry(total=2, backoff_factor=0.2),
+    ),
+)
 
-def _safe_get(dct: Any, path: List[Any]) -> Any:
-    cur = dct
-    for key in path:
-        if cur is None:
-            return None
-        try:
-            if isinstance(key, int):
-                if not isinstance(cur, list) or len(cur) <= key:
-                    return None
-                cur = cur[key]
-            else:
-                if not isinstance(cur, dict):
-                    return None
-                cur = cur.get(key)
-        except Exception:
-            return None
-    return cur
+# Medios de pago si la tienda no indica otros
+DEFAULT_PAYMENT_METHODS = ("tarjeta", "efectivo")
+
+# (conexión, lectura) en segundos
+REQUEST_TIMEOUT = (3.05, 25)
+
+# Catálogo crudo (JSON ya parseado) por (origen, query, límite). No depende de la
+# ubicación ni de los filtros, que se aplican después sobre la copia cacheada.
+CATALOG_CACHE_TTL = 60
+_CATALOG_CACHE = TTLCache(maxsize=1024, ttl=CATALOG_CACHE_TTL)
+_CATALOG_CACHE_LOCK = threading.Lock()
+
+
+def _fetch_catalog(origin: str, query: str, safe_limit: int, store_name: str) -> Optional[list]:
+    """
+    Descarga y parsea la búsqueda del catálogo VTEX, con caché TTL.
+    Devuelve None si la tienda falla o no responde una lista.
+    """
+    key = (origin, query, safe_limit)
+    with _CATALOG_CACHE_LOCK:
+        cached = _CATALOG_CACHE.get(key)
+    if cached is not None:
+        return cached
+
+    params = {
+        "ft": query,
+        "_from": 0,
+        "_to": safe_limit - 1,
+    }
+
+    try:
+        resp = SESSION.get(
+            f"{origin}/api/catalog_system/pub/products/search/",
+            params=params,
+            timeout=REQUEST_TIMEOUT,
+        )
+        resp.raise_for_status()
+        data = orjson.loads(resp.content)
+    except Exception as e:
+        print(f"Error al conectar con {store_name}: {e}")
+        return None
+
+    if not isinstance(data, list):
+        return None
+
+    # Los errores no se cachean: la siguiente búsqueda vuelve a intentar
+    with _CATALOG_CACHE_LOCK:
+        _CATALOG_CACHE[key] = data
+    return data
 
 
 def scrape_vtex_catalog_live(
@@ -44,6 +98,8 @@ def scrape_vtex_catalog_live(
     filters: Optional[SearchFilters] = None,
     limit: int = 25,
     payment_methods: Optional[List[str]] = None,
+    top_k: Optional[int] = None,
+    query_tokens: Optional[frozenset] = None,
 ) -> List[ProductResult]:
     """Scraper en vivo para tiendas VTEX via `api/catalog_system`.
 
@@ -53,36 +109,36 @@ def scrape_vtex_catalog_live(
     Retorna resultados normalizados a `ProductResult`.
     """
 
-    endpoint = f"{base_origin.rstrip('/')}/api/catalog_system/pub/products/search/"
-
-    headers = {
-        "User-Agent": DEFAULT_UA,
-        "Accept": "application/json",
-        "Accept-Language": "es-PE,es;q=0.9",
-    }
-
+    origin_no_slash = base_origin.rstrip("/")
     safe_limit = max(1, min(int(limit), 50))
-    params = {
-        "ft": query,
-        "_from": 0,
-        "_to": safe_limit - 1,
-    }
-
-    try:
-        resp = requests.get(endpoint, params=params, headers=headers, timeout=25)
-        resp.raise_for_status()
-        data = resp.json()
-    except Exception as e:
-        print(f"Error al conectar con {store_name}: {e}")
-        return []
 
-    if not isinstance(data, list):
+    data = _fetch_catalog(origin_no_slash, query, safe_limit, store_name)
+    if data is None:
         return []
 
-    query_tokens = [t for t in normalize_text(query).split() if t]
+    if query_tokens is None:
+        query_tokens = tokenize_query(query)
+    single_token = next(iter(query_tokens)) if len(query_tokens) == 1 else None
 
     results: List[ProductResult] = []
 
+    # Invariantes del bucle: prefijos de URL y medios de pago por defecto.
+    # Se guardan como tupla: cada resultado recibe su propia lista
+    origin_slash = origin_no_slash + "/"
+    result_payment_methods = tuple(payment_methods or DEFAULT_PAYMENT_METHODS)
+
+    # Distancia al usuario: la tienda tiene coordenadas fijas, se calcula una vez
+    if user_location:
+        distance = haversine_km(
+            user_location.lat,
+            user_location.lon,
+            store_lat,
+            store_lon,
+        )
+        distance_km = round(distance, 3)
+    else:
+        distance_km = None
+
     for idx, item in enumerate(data, start=1):
         if not isinstance(item, dict):
             continue
@@ -95,11 +151,16 @@ def scrape_vtex_catalog_live(
         brand = item.get("brand")
         brand_str = str(brand).strip() if brand else None
 
-        full_name = f"{name_str} {brand_str or ''}".strip()
-        norm_full = normalize_text(full_name)
-        full_words = norm_full.split()
-        if query_tokens and not all(tok in full_words for tok in query_tokens):
-            continue
+        # Filtro por palabras completas (sin query no hay nada que normalizar)
+        if query_tokens:
+            full_name = f"{name_str} {brand_str}" if brand_str else name_str
+            full_words = normalize_text(full_name).split()
+            if single_token is not None:
+                # Una sola palabra: búsqueda directa en la lista, sin armar un set
+                if single_token not in full_words:
+                    continue
+            elif not query_tokens.issubset(full_words):
+                continue
 
         product_id_raw = item.get("productId")
         try:
@@ -107,10 +168,11 @@ def scrape_vtex_catalog_live(
         except Exception:
             product_id = idx
 
-        price = _safe_get(item, ["items", 0, "sellers", 0, "commertialOffer", "Price"])
+        # Acceso directo al primer SKU: si falta algún nivel, el producto no tiene precio
         try:
-            price_f = float(price)
-        except Exception:
+            sku = item["items"][0]
+            price_f = float(sku["sellers"][0]["commertialOffer"]["Price"])
+        except (KeyError, IndexError, TypeError, ValueError):
             continue
         if price_f <= 0:
             continue
@@ -122,27 +184,19 @@ def scrape_vtex_catalog_live(
                 if not brand_str or filters.brand.lower() not in brand_str.lower():
                     continue
 
-        image_url = _safe_get(item, ["items", 0, "images", 0, "imageUrl"])
+        try:
+            image_url = sku["images"][0]["imageUrl"]
+        except (KeyError, IndexError, TypeError):
+            image_url = None
         image_url_str = str(image_url).strip() if image_url else None
 
         link = item.get("link")
         link_text = item.get("linkText")
         product_url = None
         if isinstance(link, str) and link.strip():
-            product_url = urljoin(base_origin.rstrip("/") + "/", link.strip())
+            product_url = urljoin(origin_slash, link.strip())
         elif isinstance(link_text, str) and link_text.strip():
-            product_url = f"{base_origin.rstrip('/')}/{link_text.strip()}/p"
-
-        if user_location:
-            distance = haversine_km(
-                user_location.lat,
-                user_location.lon,
-                store_lat,
-                store_lon,
-            )
-            distance_km = round(distance, 3)
-        else:
-            distance_km = None
+            product_url = f"{origin_no_slash}/{link_text.strip()}/p"
 
         results.append(
             ProductResult(
@@ -158,20 +212,9 @@ def scrape_vtex_catalog_live(
                 store_name=store_name,
                 store_location=Location(lat=store_lat, lon=store_lon),
                 distance_km=distance_km,
-                payment_methods=payment_methods or ["tarjeta", "efectivo"],
+                payment_methods=list(result_payment_methods),
             )
         )
 
-        time.sleep(0.03)
-
-    if user_location:
-        results.sort(
-            key=lambda r: (
-                r.distance_km if r.distance_km is not None else 999999,
-                r.price,
-            )
-        )
-    else:
-        results.sort(key=lambda r: r.price)
-
-    return results
+    # Todos los resultados comparten distance_km: basta ordenar por precio
+    return sort_results(results, top_k=top_k)